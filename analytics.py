@@ -0,0 +1,240 @@
+"""
+CSC111 2021 Final Project - The L Game
+
+This file stores the GameStats class, which summarizes any number of games in bounded memory, and
+the functions that fill it from the results of battle_royale and play_games, from
+simulation.simulate, and from game record files.
+
+Games are added one at a time and never stored. GameStats keeps the win counts of each colour,
+a histogram of the game lengths and a downsampled history of the cumulative win rate holding at
+most max_points points, so a summary of a million games is as small as one of a hundred and the
+plots in data_visualization draw it at once.
+
+This file is Copyright (c) 2021 Siddarth Dagar, Daniel Zhu, and Bradley Mathi.
+"""
+from __future__ import annotations
+import math
+from typing import Any, Iterable, Optional
+from bitboard import MOVE_CACHE
+from records import read_games, position_from_code
+
+# The z score of a 95% confidence interval
+Z_95 = 1.959963984540054
+
+
+class GameStats:
+    """Online statistics of a stream of games, all played from the starting board with red moving
+    first.
+
+    Instance Attributes:
+        - games: the number of games added
+        - red_wins: the number of games won by red
+        - blue_wins: the number of games won by blue
+        - total_length: the sum of the lengths of the games, in turns
+        - lengths: the number of games of each length, in turns
+        - max_points: the most points kept in self.history
+        - history: (games, red wins) after every self.stride games, oldest first
+        - stride: the number of games between the points of self.history, which doubles whenever
+          self.history would outgrow self.max_points
+
+    Representation Invariants:
+        - self.red_wins + self.blue_wins <= self.games
+        - sum(self.lengths.values()) == self.games
+        - len(self.history) <= self.max_points
+        - self.max_points >= 2
+
+    >>> stats = GameStats()
+    >>> for red_won, length in [(True, 3), (False, 4), (True, 3), (None, 100)]:
+    ...     stats.add(red_won, length)
+    >>> stats.red_wins, stats.blue_wins, stats.unfinished, stats.mean_length
+    (2, 1, 1, 27.5)
+    """
+    games: int
+    red_wins: int
+    blue_wins: int
+    total_length: int
+    lengths: dict[int, int]
+    max_points: int
+    history: list[tuple[int, int]]
+    stride: int
+
+    def __init__(self, max_points: int = 1000) -> None:
+        """Initialize statistics of no games, keeping at most max_points points of the cumulative
+        win rate.
+
+        Preconditions:
+            - max_points >= 2
+        """
+        self.games = self.red_wins = self.blue_wins = self.total_length = 0
+        self.lengths = {}
+        self.max_points = max_points
+        self.history = []
+        self.stride = 1
+
+    @property
+    def unfinished(self) -> int:
+        """The number of games that were stopped before either player won."""
+        return self.games - self.red_wins - self.blue_wins
+
+    @property
+    def mean_length(self) -> float:
+        """The mean length of the games, in turns, or 0.0 if there are none."""
+        return self.total_length / self.games if self.games else 0.0
+
+    def add(self, red_won: Optional[bool], length: int) -> None:
+        """Add a game that lasted length turns, won by red if red_won is True, by blue if it is
+        False, and by neither if it is None."""
+        self.games += 1
+        if red_won:
+            self.red_wins += 1
+        elif red_won is not None:
+            self.blue_wins += 1
+        self.total_length += length
+        self.lengths[length] = self.lengths.get(length, 0) + 1
+        if self.games % self.stride == 0:
+            self.history.append((self.games, self.red_wins))
+            if len(self.history) > self.max_points:
+                # keep every other point, and from now on record half as often
+                self.history = self.history[1::2]
+                self.stride *= 2
+
+    def red_win_rate(self, z: float = Z_95) -> tuple[float, float, float]:
+        """Return red's share of the finished games, with the Wilson score interval around it for
+        the confidence level of z.
+
+        >>> stats = GameStats()
+        >>> for red_won in [True] * 60 + [False] * 40:
+        ...     stats.add(red_won, 1)
+        >>> [round(value, 3) for value in stats.red_win_rate()]
+        [0.6, 0.502, 0.691]
+        """
+        return wilson_interval(self.red_wins, self.red_wins + self.blue_wins, z)
+
+    def first_move_advantage(self, z: float = Z_95) -> tuple[float, float, float]:
+        """Return how far red's share of the finished games is above one half, with its
+        confidence interval, as in red_win_rate. Red moves first, so between players of equal
+        strength this is the advantage of the first move."""
+        rate, low, high = self.red_win_rate(z)
+        return rate - 0.5, low - 0.5, high - 0.5
+
+    def cumulative_win_rates(self) -> list[tuple[int, float]]:
+        """Return (games, red's share of those games) at the points of self.history."""
+        return [(games, wins / games) for games, wins in self.history]
+
+    def window_win_rates(self) -> list[tuple[int, float]]:
+        """Return (games, red's share of the games since the previous point) at the points of
+        self.history, which shows a change in the players' strength that the cumulative rate
+        would hide."""
+        rates = []
+        previous_games = previous_wins = 0
+        for games, wins in self.history:
+            rates.append((games, (wins - previous_wins) / (games - previous_games)))
+            previous_games, previous_wins = games, wins
+        return rates
+
+    def length_histogram(self, bins: int = 50) -> list[tuple[int, int, int]]:
+        """Return the histogram of the game lengths as at most bins (lowest length, highest
+        length, number of games) bins of equal width.
+
+        >>> stats = GameStats()
+        >>> for length in [1, 2, 2, 9]:
+        ...     stats.add(True, length)
+        >>> stats.length_histogram(bins=2)
+        [(1, 5, 3), (6, 10, 1)]
+        """
+        if not self.lengths:
+            return []
+        lowest, highest = min(self.lengths), max(self.lengths)
+        width = max(1, math.ceil((highest - lowest + 1) / bins))
+        counts = {}
+        for length, count in self.lengths.items():
+            start = lowest + (length - lowest) // width * width
+            counts[start] = counts.get(start, 0) + count
+        return [(start, start + width - 1, counts[start]) for start in sorted(counts)]
+
+    def summary(self) -> dict[str, Any]:
+        """Return the statistics as a dictionary that can be written as JSON."""
+        rate, low, high = self.red_win_rate()
+        advantage = self.first_move_advantage()
+        return {'games': self.games, 'red_wins': self.red_wins, 'blue_wins': self.blue_wins,
+                'unfinished': self.unfinished, 'mean_length': self.mean_length,
+                'red_win_rate': {'rate': rate, 'low': low, 'high': high},
+                'first_move_advantage': {'advantage': advantage[0], 'low': advantage[1],
+                                         'high': advantage[2]},
+                'length_histogram': self.length_histogram()}
+
+
+def wilson_interval(successes: int, trials: int, z: float = Z_95) -> tuple[float, float, float]:
+    """Return (successes / trials, low, high), where low and high bound the Wilson score interval
+    of the true rate for the confidence level of z. Return (0.0, 0.0, 1.0) if trials is 0.
+
+    Preconditions:
+        - 0 <= successes <= trials
+
+    >>> wilson_interval(0, 0)
+    (0.0, 0.0, 1.0)
+    >>> [round(value, 4) for value in wilson_interval(10, 10)]
+    [1.0, 0.7225, 1.0]
+    """
+    if trials == 0:
+        return 0.0, 0.0, 1.0
+    rate = successes / trials
+    denominator = 1 + z * z / trials
+    centre = (rate + z * z / (2 * trials)) / denominator
+    spread = z * math.sqrt(rate * (1 - rate) / trials + z * z / (4 * trials * trials)) / denominator
+    return rate, max(0.0, centre - spread), min(1.0, centre + spread)
+
+
+def summarize_results(results: Iterable, max_points: int = 1000) -> GameStats:
+    """Return the statistics of results, the records of play_games ((1 if player1 won and 0
+    otherwise, turns) for each game) or the list returned by battle_royale (1 if player1 won and
+    0 otherwise). player1 plays red.
+
+    >>> summarize_results([1, 0, 1]).red_wins, summarize_results([(1, 7), (0, 5)]).mean_length
+    (2, 6.0)
+    """
+    stats = GameStats(max_points)
+    for result in results:
+        if isinstance(result, tuple):
+            stats.add(result[0] == 1, result[1])
+        else:
+            stats.add(result == 1, 0)
+    return stats
+
+
+def summarize_simulation(winners: Iterable[int], lengths: Iterable[int],
+                         max_points: int = 1000) -> GameStats:
+    """Return the statistics of the games returned by simulation.simulate."""
+    stats = GameStats(max_points)
+    for winner, length in zip(winners, lengths):
+        # simulate gives RED_WON as 1, BLUE_WON as 0 and UNFINISHED as -1
+        stats.add(None if winner < 0 else winner == 1, int(length))
+    return stats
+
+
+def summarize_records(path: str, max_points: int = 1000) -> GameStats:
+    """Return the statistics of the games in the game record file at path, read one game at a
+    time.
+
+    A game is won by the player who moved last if the player to move at its final position has
+    no L move, and is unfinished otherwise. As in play_game and simulate, the rule that an L may
+    not return to an earlier board is not applied.
+    """
+    stats = GameStats(max_points)
+    for codes in read_games(path, decode=False):
+        turns = len(codes) - 1
+        if turns < 0:
+            continue
+        red_to_move = turns % 2 == 0
+        final = position_from_code(codes[-1])
+        if MOVE_CACHE.moves(final, 'red' if red_to_move else 'blue'):
+            stats.add(None, turns)
+        else:
+            stats.add(not red_to_move, turns)
+    return stats
+
+
+if __name__ == '__main__':
+    import json
+    import sys
+    print(json.dumps(summarize_records(sys.argv[1]).summary(), indent=2))
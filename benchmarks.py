@@ -0,0 +1,238 @@
+"""
+CSC111 2021 Final Project - The L Game
+
+This file stores the benchmark suite: timings of move generation, game tree generation, whole
+games between each kind of player and the cold start of a headless game, written as JSON so a later
+run can be compared against them.
+
+Run it from the command line:
+
+    python benchmarks.py --output baseline.json
+    python benchmarks.py --compare baseline.json
+
+The second command times the same benchmarks again and lists every one that got slower than the
+baseline by more than the threshold (10% by default), exiting with status 1 if there are any.
+
+This file is Copyright (c) 2021 Siddarth Dagar, Daniel Zhu, and Bradley Mathi.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Callable
+from constants import STARTING_BOARD
+from board import Board
+from bitboard import MOVE_CACHE
+from gametree import gen_gametree
+from records import read_csv_games
+from player import RandomPlayer, MiniMaxPlayer, AlphaBetaPlayer, MCTSPlayer, TablebasePlayer
+from data_visualization import play_games
+
+SAMPLE_GAME_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sample_game.csv')
+DEFAULT_THRESHOLD = 0.10
+
+# A headless batch job: it plays one game in a new interpreter, and fails if the game pulled in
+# the GUI or the plotting library
+_HEADLESS_GAME = '''
+import sys
+from data_visualization import play_games
+from player import AlphaBetaPlayer, RandomPlayer
+play_games(AlphaBetaPlayer(2, True), RandomPlayer(None), 1, seed=111)
+sys.exit(any(name in sys.modules for name in ('pygame', 'plotly')))
+'''
+
+
+def sample_boards(games_file: str = SAMPLE_GAME_FILE) -> list[Board]:
+    """Return a Board for every position of the first game in games_file.
+
+    The file is read by records.read_csv_games. The first board is the starting board, and each
+    later board is the board after one more turn, so red is to move on every other board.
+
+    >>> boards = sample_boards()
+    >>> boards[0].board == STARTING_BOARD, [board.is_red_move for board in boards[:3]]
+    (True, [True, False, True])
+    """
+    boards = []
+    for i, position in enumerate(next(read_csv_games(games_file))):
+        is_red_move = i % 2 == 0
+        boards.append(Board(position.to_board(), [], is_red_move, 'red' if is_red_move else 'blue'))
+    return boards
+
+
+def time_call(function: Callable[[], Any], repeat: int = 5,
+              setup: Callable[[], Any] = lambda: None) -> dict[str, float]:
+    """Call function repeat times, calling setup before each call outside the timing, and return
+    the best and median times in seconds.
+
+    Preconditions:
+        - repeat >= 1
+    """
+    times = []
+    for _ in range(repeat):
+        setup()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {'seconds': min(times), 'median': statistics.median(times)}
+
+
+def bench_move_generation(boards: list[Board], repeat: int = 5) -> dict[str, dict[str, float]]:
+    """Time Board.get_valid_moves on every state within one turn of the given boards: the boards
+    themselves, the boards after each of their L moves, and the boards after each neutral move
+    that follows.
+
+    The cold timing clears MOVE_CACHE before each pass over the states, and the warm timing
+    passes over them again with the cache already filled.
+    """
+    states = []
+    for board in boards:
+        states.append(board)
+        for l_move in board.get_valid_moves():
+            after_l_move = Board(l_move, [], board.is_red_move, 'black')
+            states.append(after_l_move)
+            for neutral_move in after_l_move.get_valid_moves():
+                states.append(Board(neutral_move, [], not board.is_red_move,
+                                    'blue' if board.is_red_move else 'red'))
+
+    def generate() -> None:
+        """Generate the moves of every state."""
+        for state in states:
+            state.get_valid_moves()
+
+    results = {'get_valid_moves/cold': time_call(generate, repeat, MOVE_CACHE.clear)}
+    generate()
+    results['get_valid_moves/warm'] = time_call(generate, repeat)
+    return results
+
+
+def bench_gametree(boards: list[Board], depths: tuple[int, ...] = (1, 2, 3, 4),
+                   repeat: int = 3) -> dict[str, dict[str, float]]:
+    """Time gen_gametree at every depth from STARTING_BOARD and from the other boards, with an
+    empty MOVE_CACHE each time."""
+    results = {}
+    for depth in depths:
+        results[f'gen_gametree/start/depth{depth}'] = time_call(
+            lambda: gen_gametree(depth, Board(STARTING_BOARD)), repeat, MOVE_CACHE.clear)
+        results[f'gen_gametree/midgame/depth{depth}'] = time_call(
+            lambda: [gen_gametree(depth, board) for board in boards], repeat, MOVE_CACHE.clear)
+    return results
+
+
+def bench_battle_royale(games: int = 20, repeat: int = 1) -> dict[str, dict[str, float]]:
+    """Time games between each kind of AI player (as red) and a RandomPlayer (as blue).
+
+    The games are seeded as in data_visualization.play_games, so every run plays the same games.
+    Along with the time of all the games, each result has the games and turns played per second.
+    MCTSPlayer runs hundreds of random playouts per move, so it only plays a fifth of the games.
+    """
+    players = {
+        'random': (lambda: RandomPlayer(None), games),
+        'minimax2': (lambda: MiniMaxPlayer(2, True), games),
+        'alphabeta3': (lambda: AlphaBetaPlayer(3, True), games),
+        'mcts25': (lambda: MCTSPlayer(True, iterations=25, seed=0), max(1, games // 5)),
+        'tablebase': (lambda: TablebasePlayer(True), games)
+    }
+    results = {}
+    for name, (player, n) in players.items():
+        records = []
+        timing = time_call(
+            lambda: records.append(play_games(player(), RandomPlayer(None), n, seed=111)), repeat)
+        turns = sum(length for _, length in records[-1])
+        timing['games_per_second'] = n / timing['seconds']
+        timing['turns_per_second'] = turns / timing['seconds']
+        results[f'battle_royale/{name}'] = timing
+    return results
+
+
+def bench_cold_start(repeat: int = 5) -> dict[str, dict[str, float]]:
+    """Time a new Python interpreter that imports the engine and plays one game without a
+    display, and one that does nothing, for the time Python itself takes to start.
+
+    Raise RuntimeError if the game fails or imports pygame or plotly, which only the window and
+    the plots should need.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+
+    def run(code: str) -> None:
+        """Run code in a new interpreter."""
+        if subprocess.run([sys.executable, '-c', code], cwd=directory).returncode != 0:
+            raise RuntimeError('the headless game failed or imported pygame or plotly')
+
+    return {'cold_start/python': time_call(lambda: run('pass'), repeat),
+            'cold_start/headless_game': time_call(lambda: run(_HEADLESS_GAME), repeat)}
+
+
+def run_benchmarks(quick: bool = False) -> dict[str, Any]:
+    """Run every benchmark and return the results, along with a description of the machine.
+
+    quick runs fewer repeats, stops gen_gametree at depth 3 and plays fewer games, for a fast
+    check that the suite works.
+    """
+    boards = sample_boards()
+    repeat = 1 if quick else 3
+    results = {}
+    results.update(bench_move_generation(boards, repeat))
+    results.update(bench_gametree(boards[1:], (1, 2, 3) if quick else (1, 2, 3, 4), repeat))
+    results.update(bench_battle_royale(4 if quick else 20, repeat))
+    results.update(bench_cold_start(repeat))
+    return {'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'time': time.strftime('%Y-%m-%d %H:%M:%S')},
+            'results': results}
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any],
+            threshold: float = DEFAULT_THRESHOLD) -> list[str]:
+    """Return a description of every benchmark in both current and baseline whose best time in
+    current is more than threshold (as a fraction) slower than in baseline.
+
+    >>> compare({'results': {'a': {'seconds': 1.2}, 'b': {'seconds': 1.0}}},
+    ...         {'results': {'a': {'seconds': 1.0}, 'b': {'seconds': 1.0}}})
+    ['a: 1.000s -> 1.200s (+20%)']
+    """
+    regressions = []
+    for name, result in current['results'].items():
+        if name not in baseline['results']:
+            continue
+        old, new = baseline['results'][name]['seconds'], result['seconds']
+        if new > old * (1 + threshold):
+            regressions.append(f'{name}: {old:.3f}s -> {new:.3f}s ({new / old - 1:+.0%})')
+    return regressions
+
+
+def main(argv: list[str]) -> int:
+    """Run the benchmarks as the command line arguments argv ask, and return the exit status."""
+    parser = argparse.ArgumentParser(description='Time the L Game move generation and searches.')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='report regressions against this JSON file of earlier results')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='the slowdown, as a fraction, that counts as a regression')
+    parser.add_argument('--quick', action='store_true', help='run a shorter version of the suite')
+    args = parser.parse_args(argv)
+
+    current = run_benchmarks(args.quick)
+    for name, result in current['results'].items():
+        print(f'{name:40} {result["seconds"]:10.4f}s')
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump(current, file, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(current, baseline, args.threshold)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            return 1
+        print(f'No regressions against {args.compare}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,389 @@
+"""
+CSC111 2021 Final Project - The L Game
+
+This file stores the bitboard representation of an L Game position and the bitboard move generator.
+A position is three 16-bit masks, one each for the red L, the blue L and the two neutral pieces,
+where square (row, col) is stored in bit row * COLS + col.
+
+This file is Copyright (c) 2021 Siddarth Dagar, Daniel Zhu, and Bradley Mathi.
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Any, Iterable, NamedTuple, Optional
+from constants import ROWS, COLS
+
+FULL_MASK = (1 << (ROWS * COLS)) - 1
+_SQUARE_BITS = tuple(1 << index for index in range(ROWS * COLS))
+_ROW_MASK = (1 << COLS) - 1
+_ROW_SHIFTS = tuple(range(0, ROWS * COLS, COLS))
+
+
+def _row_colours(key: int) -> tuple[str, ...]:
+    """Return the colours of one board row, where key packs the row's red, blue and neutral bits
+    as red | blue << COLS | neutral << 2 * COLS."""
+    colours = []
+    for col in range(COLS):
+        if key >> col & 1:
+            colours.append('red')
+        elif key >> (col + COLS) & 1:
+            colours.append('blue')
+        elif key >> (col + 2 * COLS) & 1:
+            colours.append('black')
+        else:
+            colours.append('white')
+    return tuple(colours)
+
+
+# Position.to_board runs for every generated move, so it builds each row from this table
+_ROW_COLOURS = tuple(_row_colours(key) for key in range(1 << 3 * COLS))
+
+# The 8 ways of laying an L around its corner square, as (row, col) offsets from that corner. They
+# are listed in the same order that Board.get_valid_moves has always tried them, so the bitboard
+# generator returns its moves in the same order as the list based one.
+L_PATTERNS = (((0, 0), (1, 0), (2, 0), (0, 1)),
+              ((0, 0), (1, 0), (0, -1), (0, -2)),
+              ((0, 0), (-1, 0), (-2, 0), (0, -1)),
+              ((0, 0), (-1, 0), (0, 1), (0, 2)),
+              ((0, 0), (1, 0), (2, 0), (0, -1)),
+              ((0, 0), (1, 0), (0, 1), (0, 2)),
+              ((0, 0), (-1, 0), (-2, 0), (0, 1)),
+              ((0, 0), (-1, 0), (0, -1), (0, -2)))
+
+
+def square_bit(row: int, col: int) -> int:
+    """Return the bit for the square at (row, col).
+
+    Preconditions:
+        - 0 <= row < ROWS
+        - 0 <= col < COLS
+
+    >>> square_bit(0, 0), square_bit(1, 2)
+    (1, 64)
+    """
+    return 1 << (row * COLS + col)
+
+
+def squares(mask: int) -> list[int]:
+    """Return the indices of the squares set in mask, in row-major order.
+
+    >>> squares(0b1000000000000101)
+    [0, 2, 15]
+    """
+    result = []
+    while mask:
+        low = mask & -mask
+        result.append(low.bit_length() - 1)
+        mask ^= low
+    return result
+
+
+class Position(NamedTuple):
+    """An L Game position stored as one 16-bit mask per kind of piece.
+
+    Instance Attributes:
+        - red: the squares covered by the red L
+        - blue: the squares covered by the blue L
+        - neutral: the squares holding the two neutral pieces
+
+    Representation Invariants:
+        - self.red & self.blue == 0
+        - (self.red | self.blue) & self.neutral == 0
+    """
+    red: int
+    blue: int
+    neutral: int
+
+    @classmethod
+    def from_board(cls, board: list) -> Position:
+        """Return the position stored in the nested list board.
+
+        Preconditions:
+            - len(board) == ROWS and all(len(row) == COLS for row in board)
+
+        >>> from constants import STARTING_BOARD
+        >>> Position.from_board(STARTING_BOARD).to_board() == STARTING_BOARD
+        True
+        """
+        red = blue = neutral = 0
+        bit = 1
+        for row in board:
+            for colour in row:
+                if colour == 'red':
+                    red |= bit
+                elif colour == 'blue':
+                    blue |= bit
+                elif colour == 'black':
+                    neutral |= bit
+                elif colour != 'white':
+                    raise ValueError(f'{colour!r} is not a piece colour')
+                bit <<= 1
+        return cls(red, blue, neutral)
+
+    def to_board(self) -> list[list[str]]:
+        """Return this position as a new nested list of colour strings."""
+        red, blue, neutral = self
+        return [list(_ROW_COLOURS[(red >> shift & _ROW_MASK) | (blue >> shift & _ROW_MASK) << COLS
+                                  | (neutral >> shift & _ROW_MASK) << 2 * COLS])
+                for shift in _ROW_SHIFTS]
+
+    def empty(self) -> int:
+        """Return the mask of the squares that no piece covers."""
+        return FULL_MASK & ~(self.red | self.blue | self.neutral)
+
+    def pack(self) -> int:
+        """Return this position as a single int, with the red, blue and neutral masks in bits 32 to
+        47, 16 to 31 and 0 to 15.
+
+        >>> position = Position(0b111 << 4 | 1, 0b1110 << 8 | 1 << 15, 1 << 3 | 1 << 12)
+        >>> Position.unpack(position.pack())
+        Position(red=113, blue=36352, neutral=4104)
+        """
+        return self.red << 32 | self.blue << 16 | self.neutral
+
+    @classmethod
+    def unpack(cls, key: int) -> Position:
+        """Return the position that key, returned by Position.pack, stores."""
+        return _new_position(cls, (key >> 32, key >> 16 & FULL_MASK, key & FULL_MASK))
+
+
+# Position(...) goes through the NamedTuple argument parsing; the move generator builds thousands of
+# positions per search, so it calls tuple.__new__ directly instead.
+_new_position = tuple.__new__
+
+
+def _pattern_shape(pattern: tuple) -> tuple[int, int, int]:
+    """Return (fits, shape, offset) for one of L_PATTERNS.
+
+    fits is the mask of corner squares the pattern can be laid around without leaving the board.
+    Laying it around square index i covers the squares in (shape << i) >> offset.
+    """
+    fits = 0
+    for row in range(ROWS):
+        for col in range(COLS):
+            if all(0 <= row + d_row < ROWS and 0 <= col + d_col < COLS
+                   for d_row, d_col in pattern):
+                fits |= square_bit(row, col)
+    offset = -min(d_row * COLS + d_col for d_row, d_col in pattern)
+    shape = 0
+    for d_row, d_col in pattern:
+        shape |= 1 << (d_row * COLS + d_col + offset)
+    return fits, shape, offset
+
+
+def _build_l_placements() -> tuple[int, ...]:
+    """Return the mask of every L placement on an empty board, in the order described in
+    l_placements."""
+    placements = []
+    for index in range(ROWS * COLS):
+        for pattern in L_PATTERNS:
+            fits, shape, offset = _pattern_shape(pattern)
+            if fits >> index & 1:
+                placements.append((shape << index) >> offset)
+    return tuple(placements)
+
+
+def _build_neutral_moves() -> dict[int, tuple[tuple[int, int], ...]]:
+    """Return every neutral piece relocation, keyed by the mask of the two neutral squares.
+
+    Each relocation is a pair (needed, neutral) where neutral is the new neutral mask and needed is
+    the square that must not be covered by an L for the relocation to be legal. The relocations are
+    in the order described in _neutral_moves, and the one that leaves both pieces in place has
+    needed == 0.
+    """
+    table = {}
+    for first in range(ROWS * COLS):
+        for second in range(first + 1, ROWS * COLS):
+            top, bottom = 1 << first, 1 << second
+            neutral = top | bottom
+            relocations = []
+            for start, may_stay in ((top, False), (bottom, True)):
+                rest = neutral ^ start
+                for target in _SQUARE_BITS:
+                    if target == start:
+                        if may_stay:
+                            relocations.append((0, neutral))
+                    elif not target & rest:
+                        relocations.append((target, rest | target))
+            table[neutral] = tuple(relocations)
+    return table
+
+
+# Every L placement (48 of them) and every neutral relocation, built once at import. Move
+# generation is just a filter of these tables against the occupied squares.
+L_PLACEMENTS = _build_l_placements()
+NEUTRAL_MOVES = _build_neutral_moves()
+
+
+def l_placements(free: int) -> list[int]:
+    """Return the mask of every L placement lying entirely on the squares in free.
+
+    Placements are returned in the order Board.get_valid_moves tries them: by corner square in
+    row-major order, then by L_PATTERNS.
+
+    >>> len(l_placements(FULL_MASK))
+    48
+    """
+    blocked = FULL_MASK & ~free
+    return [mask for mask in L_PLACEMENTS if not mask & blocked]
+
+
+def next_turn(is_red_move: bool, move_type: str) -> tuple[bool, str]:
+    """Return (is_red_move, move_type) for the move after a move_type move, following the turn
+    order of gen_gametree: an L move is followed by the same player's neutral move, and a neutral
+    move by the other player's L move.
+
+    >>> next_turn(True, 'red'), next_turn(True, 'black')
+    ((True, 'black'), (False, 'blue'))
+    """
+    if move_type != 'black':
+        return is_red_move, 'black'
+    elif is_red_move:
+        return False, 'blue'
+    else:
+        return True, 'red'
+
+
+def valid_moves(position: Position, move_type: str, previous: Iterable = ()) -> list[Position]:
+    """Return every position reachable from position by moving the piece(s) of move_type.
+
+    This gives the same moves, in the same order, as Board.get_valid_moves. L moves that land on
+    a position in previous are left out; neutral moves are never filtered.
+
+    Preconditions:
+        - move_type in {'red', 'blue', 'black'}
+
+    >>> from constants import STARTING_BOARD
+    >>> start = Position.from_board(STARTING_BOARD)
+    >>> len(valid_moves(start, 'red')), len(valid_moves(start, 'black'))
+    (5, 13)
+    """
+    if move_type == 'black':
+        return _neutral_moves(position)
+
+    if move_type == 'red':
+        own, other = position.red, position.blue
+    else:
+        own, other = position.blue, position.red
+    blocked = other | position.neutral
+    if previous:
+        previous = set(previous)
+    move_set = []
+    for mask in L_PLACEMENTS:
+        if mask & blocked or mask == own:
+            continue
+        if move_type == 'red':
+            move = _new_position(Position, (mask, other, position.neutral))
+        else:
+            move = _new_position(Position, (other, mask, position.neutral))
+        if not previous or move not in previous:
+            move_set.append(move)
+    return move_set
+
+
+def _neutral_moves(position: Position) -> list[Position]:
+    """Return every neutral piece move from position.
+
+    The top neutral piece (first in row-major order) is moved first, then the bottom one. Leaving
+    the bottom piece where it is stands for not moving a neutral piece at all, so it is the only
+    move that repeats position.
+    """
+    red, blue, neutral = position
+    pieces = red | blue
+    return [_new_position(Position, (red, blue, moved))
+            for needed, moved in NEUTRAL_MOVES[neutral] if not needed & pieces]
+
+
+class MoveCache:
+    """A least recently used cache of the results of valid_moves, keyed by (position, move_type).
+
+    Results are returned as tuples of Positions, which cannot be changed, so a caller cannot
+    corrupt what the cache gives to the next caller.
+
+    Instance Attributes:
+        - capacity: the most results the cache holds before evicting the least recently used
+        - hits: the number of lookups answered from the cache
+        - misses: the number of lookups that had to generate the moves
+        - evictions: the number of results thrown out to make room for new ones
+        - table: where the moves that are not cached are looked up, such as a tables.MoveTable,
+          or None to generate them with valid_moves
+
+    Representation Invariants:
+        - self.capacity > 0
+        - len(self) <= self.capacity
+
+    >>> from constants import STARTING_BOARD
+    >>> cache = MoveCache(2)
+    >>> start = Position.from_board(STARTING_BOARD)
+    >>> cache.moves(start, 'red') == tuple(valid_moves(start, 'red'))
+    True
+    >>> _ = cache.moves(start, 'red'), cache.moves(start, 'blue'), cache.moves(start, 'black')
+    >>> cache.hits, cache.misses, cache.evictions, len(cache)
+    (1, 3, 1, 2)
+    """
+    capacity: int
+    hits: int
+    misses: int
+    evictions: int
+    table: Optional[Any]
+
+    # Private Instance Attributes:
+    #  - _entries: the cached results, from least to most recently used
+    _entries: OrderedDict[tuple[Position, str], tuple[Position, ...]]
+
+    def __init__(self, capacity: int = 1 << 13) -> None:
+        """Initialize an empty cache holding at most capacity results.
+
+        Preconditions:
+            - capacity > 0
+        """
+        self.capacity = capacity
+        self.hits = self.misses = self.evictions = 0
+        self.table = None
+        self._entries = OrderedDict()
+
+    def moves(self, position: Position, move_type: str) -> tuple[Position, ...]:
+        """Return valid_moves(position, move_type) as a tuple, generating it (or looking it up
+        in self.table) only if it is not cached.
+
+        Preconditions:
+            - move_type in {'red', 'blue', 'black'}
+        """
+        key = (position, move_type)
+        entries = self._entries
+        moves = entries.get(key)
+        if moves is None:
+            self.misses += 1
+            if self.table is None:
+                moves = entries[key] = tuple(valid_moves(position, move_type))
+            else:
+                moves = entries[key] = self.table.moves(position, move_type)
+            if len(entries) > self.capacity:
+                entries.popitem(last=False)
+                self.evictions += 1
+        else:
+            self.hits += 1
+            try:
+                entries.move_to_end(key)
+            except KeyError:
+                # another thread (such as a pondering player) evicted it since the lookup
+                pass
+        return moves
+
+    def clear(self) -> None:
+        """Remove every cached result. The counters are kept."""
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        """Return the number of results cached."""
+        return len(self._entries)
+
+    def stats(self) -> dict[str, float]:
+        """Return the cache's counters, along with its hit rate and how full it is."""
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'fill': len(self) / self.capacity}
+
+
+# The cache shared by Board, GameTree and AlphaBetaSearch
+MOVE_CACHE = MoveCache()
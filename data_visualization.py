@@ -4,10 +4,15 @@ This file is for visualizing the data and for getting AI to play against each ot
 
 This file is Copyright (c) 2021 Siddarth Dagar, Daniel Zhu, and Bradley Mathi.
 """
+import copy
 import csv
-import plotly.express as plt
+import multiprocessing
+import random
+import instrumentation
 from player import *
-from typing import Any
+from typing import Any, Optional, Union
+from analytics import GameStats, summarize_results
+from tables import share_moves
 
 
 def print_sample(games_file: str) -> None:
@@ -25,70 +30,162 @@ def print_sample(games_file: str) -> None:
                 print(row[i])
 
 
-def battle_royale(player1: Any, player2: Any) -> list:
+def battle_royale(player1: Any, player2: Any, n: int = 100, workers: Optional[int] = None,
+                  seed: Any = 0, profile: Optional[str] = None) -> list:
     """
     This function has to AI's play against each other and plots the result of their games.
+
+    player1 plays red and player2 plays blue. If workers is given, the n games are spread over a
+    pool of that many processes as described in play_games; otherwise they are played one after
+    another in this process by the same two player objects.
+
+    If profile is given, the search instrumentation is turned on and a summary of every move is
+    printed (if profile is '-') or appended to the file profile, as in instrumentation.report.
+    Only games played in this process are profiled, so profile is ignored if workers is given.
+
+    Preconditions:
+        - n >= 0
+        - workers is None or workers >= 1
+    """
+    if workers is None:
+        if profile is None:
+            return [play_game(player1, player2)[0] for _ in range(n)]
+        instrumentation.enable()
+        try:
+            return [play_game(player1, player2, profile, f'game {i + 1} ')[0] for i in range(n)]
+        finally:
+            instrumentation.disable()
+    return [won for won, _ in play_games(player1, player2, n, workers, seed)]
+
+
+def play_game(player1: Any, player2: Any, profile: Optional[str] = None,
+              label: str = '') -> tuple[int, int]:
+    """
+    Play one game between player1 (red) and player2 (blue) and return its record: (1 if player1
+    won and 0 otherwise, the number of turns played).
+
+    If profile is given, the search statistics of each move are reported to it after the move
+    with instrumentation.report, labelled by label followed by the turn and move; the
+    instrumentation must already be turned on.
     """
-    n = 100
-    win_list = []
     player_access = {'red': player1, 'blue': player2}
-    for i in range(n):
-        new_game_board = Board()
+    turns = 0
+    new_game_board = Board()
+    move_set = new_game_board.get_valid_moves()
+    while len(move_set) != 0:
+        # Finds the player for this turn
+        curr_player = player_access[new_game_board.move_type]
+        # Receives L-move coords from player
+        l_move = curr_player.make_move(new_game_board)
+        instrumentation.report(f'{label}turn {turns + 1} {new_game_board.move_type} L move',
+                               profile)
+        # Converts L-move coord to a new board
+        new_game_board.board = l_move
+        new_game_board.move_type = 'black'
+        # determines possible neutral-move set and receives neutral-move from player
         move_set = new_game_board.get_valid_moves()
-        while len(move_set) != 0:
-            # Finds the player for this turn
-            curr_player = player_access[new_game_board.move_type]
-            # Receives L-move coords from player
-            l_move = curr_player.make_move(new_game_board)
-            # Converts L-move coord to a new board
-            new_game_board.board = l_move
-            new_game_board.move_type = 'black'
-            # determines possible neutral-move set and receives neutral-move from player
-            move_set = new_game_board.get_valid_moves()
-            neutral_move = curr_player.make_move(new_game_board)
-            # changes board parameters to match move made by player and updates visual
-            new_game_board.board = neutral_move
-            new_game_board.is_red_move = not new_game_board.is_red_move
-            if new_game_board.is_red_move:
-                new_game_board.move_type = 'red'
-            else:
-                new_game_board.move_type = 'blue'
-            # determines possible l-moves for next turn to check if the game can continue
-            move_set = new_game_board.get_valid_moves()
+        neutral_move = curr_player.make_move(new_game_board)
+        instrumentation.report(f'{label}turn {turns + 1} neutral move', profile)
+        # changes board parameters to match move made by player and updates visual
+        new_game_board.board = neutral_move
+        new_game_board.is_red_move = not new_game_board.is_red_move
         if new_game_board.is_red_move:
-            win_list.append(0)
+            new_game_board.move_type = 'red'
         else:
-            win_list.append(1)
-    return win_list
+            new_game_board.move_type = 'blue'
+        turns += 1
+        # determines possible l-moves for next turn to check if the game can continue
+        move_set = new_game_board.get_valid_moves()
+    if new_game_board.is_red_move:
+        return 0, turns
+    else:
+        return 1, turns
+
+
+def play_games(player1: Any, player2: Any, n: int, workers: int = 1,
+               seed: Any = 0) -> list[tuple[int, int]]:
+    """
+    Play n games between player1 (red) and player2 (blue) over a pool of workers processes, and
+    return the record of each game (see play_game) in the order the games were numbered.
+
+    Every game is played by fresh copies of the two players, with the random module seeded from
+    seed and the game's number. The records are therefore the same for any number of workers.
+
+    Preconditions:
+        - n >= 0
+        - workers >= 1
+    """
+    jobs = [(seed, i) for i in range(n)]
+    if workers == 1:
+        _init_worker(player1, player2)
+        return [_play_seeded_game(job) for job in jobs]
+    with multiprocessing.Pool(workers, initializer=_init_pool_worker,
+                              initargs=(player1, player2)) as pool:
+        return pool.map(_play_seeded_game, jobs, chunksize=max(1, n // (workers * 4)))
+
+
+# The players of the play_games call this process is working for
+_worker_players = None
+
 
+def _init_worker(player1: Any, player2: Any) -> None:
+    """Store the players for the games this process will play."""
+    global _worker_players
+    _worker_players = (player1, player2)
 
-def plot_winrates(wins: list) -> None:
+
+def _init_pool_worker(player1: Any, player2: Any) -> None:
+    """Start a worker process of a play_games pool: store the players, and read the moves it does
+    not have cached from the move table that every worker shares."""
+    share_moves()
+    _init_worker(player1, player2)
+
+
+def _play_seeded_game(job: tuple[Any, int]) -> tuple[int, int]:
+    """Play game number job[1] of a play_games call with seed job[0], and return its record."""
+    seed, i = job
+    random.seed(f'{seed}-{i}')
+    player1, player2 = copy.deepcopy(_worker_players)
+    return play_game(player1, player2)
+
+
+def plot_winrates(results: Union[list, GameStats]) -> None:
     """
-    This function should use battle_royale results to plot results of the win rates.
+    This function should use battle_royale results to plot the win rate of player1 over the games,
+    measured separately over each stretch of games between the points of the summary.
 
-    Assume wins is the list returned by battle_royale. A 1 corresponds to player1's win.
+    results is either a GameStats or the list returned by battle_royale, where a 1 corresponds to
+    player1's win; player1 plays red. Only the at most GameStats.max_points points of the summary
+    are drawn, however many games were played.
     """
-    figure = plt.scatter(x=[x for x in range(1, len(wins) + 1)], y=wins)
+    import plotly.express as plt
+    stats = _as_stats(results)
+    rates = stats.window_win_rates()
+    figure = plt.line(x=[games for games, _ in rates], y=[rate for _, rate in rates])
     figure.update_layout(
-        title="Win Percents",
+        title="Win Rates",
         xaxis_title="Games Played",
-        yaxis_title="Winner",
+        yaxis_title="Share of the latest games won by Player 1",
     )
 
     figure.show()
 
 
-def plot_winpercent(wins: list) -> None:
+def plot_winpercent(results: Union[list, GameStats]) -> None:
     """
     This function should use battle_royale results to plot results of the win rates as percents of
-    the total.
+    the total, with the 95% confidence interval of the final win rate in the title.
 
-    Assume wins is the list returned by battle_royale. A 1 corresponds to player1's win.
+    results is either a GameStats or the list returned by battle_royale, as in plot_winrates.
     """
-    figure = plt.scatter(x=[x for x in range(1, len(wins) + 1)],
-                         y=cumulated(wins))
+    import plotly.express as plt
+    stats = _as_stats(results)
+    rates = stats.cumulative_win_rates()
+    rate, low, high = stats.red_win_rate()
+    figure = plt.line(x=[games for games, _ in rates], y=[rate * 100 for _, rate in rates])
     figure.update_layout(
-        title="Winrates",
+        title=f"Winrates (Player 1 won {rate:.1%} of finished games, 95% CI {low:.1%} to "
+              f"{high:.1%})",
         xaxis_title="Games Played",
         yaxis_title="Percentage of games won by Player 1",
     )
@@ -96,16 +193,45 @@ def plot_winpercent(wins: list) -> None:
     figure.show()
 
 
+def plot_game_lengths(results: GameStats, bins: int = 50) -> None:
+    """
+    Plot the histogram of the lengths of the games summarized by results, in at most bins bars.
+    """
+    import plotly.express as plt
+    histogram = results.length_histogram(bins)
+    figure = plt.bar(x=[(low + high) / 2 for low, high, _ in histogram],
+                     y=[count for _, _, count in histogram])
+    figure.update_layout(
+        title=f"Game Lengths (mean {results.mean_length:.1f} turns)",
+        xaxis_title="Turns",
+        yaxis_title="Games",
+    )
+
+    figure.show()
+
+
+def _as_stats(results: Union[list, GameStats]) -> GameStats:
+    """Return results as a GameStats, summarizing it first if it is a list of battle_royale
+    results."""
+    if isinstance(results, GameStats):
+        return results
+    return summarize_results(results)
+
+
 def cumulated(lst: list) -> list:
     """
-    This function should return the cumulative sum divided by 100 at each index of the list lst.
+    This function should return the percentage of the items of lst that are 1 at each index of
+    the list lst, counting the items up to and including that index.
 
     Precondition:
         - lst != []
+
+    >>> cumulated([1, 0, 1, 1])
+    [100.0, 50.0, 66.66666666666667, 75.0]
     """
     new_lst = []
     total = 0
-    for item in lst:
+    for i, item in enumerate(lst):
         total += item
-        new_lst.append(total/100)
+        new_lst.append(total * 100 / (i + 1))
     return new_lst
@@ -0,0 +1,83 @@
+"""
+CSC111 2021 Final Project - The L Game
+
+This file stores the Deadline class, the wall-clock time limit that the game tree search and
+AlphaBetaSearch check as they go, and the SearchTimeout exception they raise when it passes.
+
+A search checks its deadline at every position it visits, but only reads the clock (and calls the
+deadline's poll function, which lets a window keep handling its events during a long search) once
+every few hundred positions.
+
+This file is Copyright (c) 2021 Siddarth Dagar, Daniel Zhu, and Bradley Mathi.
+"""
+from __future__ import annotations
+import math
+import time
+from typing import Callable, Optional
+
+
+class SearchTimeout(Exception):
+    """Raised by Deadline.check when a search runs past its deadline."""
+
+
+class Deadline:
+    """A time limit for a search.
+
+    Instance Attributes:
+        - end: the time.perf_counter() value at which the deadline passes
+        - poll: a function called whenever the clock is read, or None
+        - interval: the number of checks between readings of the clock
+
+    Representation Invariants:
+        - self.interval >= 1
+
+    >>> deadline = Deadline(0.0, interval=1)
+    >>> try:
+    ...     deadline.check()
+    ... except SearchTimeout:
+    ...     print('out of time')
+    out of time
+    """
+    end: float
+    poll: Optional[Callable[[], object]]
+    interval: int
+
+    # Private Instance Attributes:
+    #  - _countdown: the number of checks left before the clock is next read
+    _countdown: int
+
+    def __init__(self, seconds: float, poll: Optional[Callable[[], object]] = None,
+                 interval: int = 256) -> None:
+        """Initialize a deadline seconds from now, which may be math.inf for a deadline that only
+        passes when it is cancelled.
+
+        Preconditions:
+            - interval >= 1
+        """
+        self.end = time.perf_counter() + seconds
+        self.poll = poll
+        self.interval = interval
+        self._countdown = interval
+
+    def cancel(self) -> None:
+        """Make the deadline pass now, so the search checking it stops at its next clock reading.
+
+        This may be called from another thread than the one searching.
+        """
+        self.end = -math.inf
+
+    def remaining(self) -> float:
+        """Return the number of seconds until the deadline, which is negative once it has passed."""
+        return self.end - time.perf_counter()
+
+    def check(self) -> None:
+        """Record that the search visited one more position, raising SearchTimeout if this is one
+        of the visits at which the clock is read and the deadline has passed."""
+        self._countdown -= 1
+        if self._countdown:
+            return
+        self._countdown = self.interval
+        if self.poll is not None:
+            self.poll()
+        if time.perf_counter() >= self.end:
+            raise SearchTimeout
@@ -0,0 +1,265 @@
+"""
+CSC111 2021 Final Project - The L Game
+
+This file stores the GameLoop class, which runs a game between a human (red) and an AI (blue) in
+the pygame window.
+
+The loop never waits for anything. Every frame it handles the window's events, checks whether the
+AI has chosen its move, and draws the board, so the window keeps responding at FPS frames per
+second whatever the game is waiting for. The AI chooses its moves in a background thread, and the
+human chooses theirs, neutral piece included, by clicking in the window and pressing keys; the
+window's caption says what is expected next.
+
+This file is Copyright (c) 2021 Siddarth Dagar, Daniel Zhu, and Bradley Mathi.
+"""
+from __future__ import annotations
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Optional
+import pygame
+import instrumentation
+from constants import FPS, ROWS, COLS, STARTING_BOARD
+from board import Board
+from player import HumanPlayer
+from renderer import BoardRenderer
+
+# The states of the game loop: the human chooses the four squares of their L, chooses a neutral
+# piece to move (or skips the neutral move), chooses where to put it, the AI plays its L move and
+# neutral move, and the game is over
+CHOOSE_L = 'choose L'
+CHOOSE_NEUTRAL = 'choose neutral'
+PLACE_NEUTRAL = 'place neutral'
+AI_TURN = 'AI turn'
+GAME_OVER = 'game over'
+
+# The keys that skip the human's neutral move, and the key that takes back a selection
+SKIP_KEYS = (pygame.K_RETURN, pygame.K_KP_ENTER, pygame.K_SPACE, pygame.K_n)
+CANCEL_KEY = pygame.K_ESCAPE
+
+# The seconds an AI move stays on the board before the AI's next move is shown
+AI_MOVE_DELAY = 0.5
+
+_CAPTIONS = {CHOOSE_L: 'Red: click the four squares of your L',
+             CHOOSE_NEUTRAL: 'Red: click a neutral piece to move it, or press Enter to skip',
+             PLACE_NEUTRAL: 'Red: click an empty square for the neutral piece (Esc to undo)',
+             AI_TURN: 'Blue is thinking...'}
+
+
+class GameLoop:
+    """A game of the L Game in the pygame window, run as a state machine by step().
+
+    Instance Attributes:
+        - board: the game being played
+        - human: the red player, who turns the clicks into moves
+        - ai: the blue player, whose make_move(board) returns its move
+        - renderer: the renderer drawing the board in the window
+        - state: what the game is waiting for, one of CHOOSE_L, CHOOSE_NEUTRAL, PLACE_NEUTRAL,
+          AI_TURN and GAME_OVER
+        - winner: 'red' or 'blue' once the game is over, and None before
+        - profile: where the search instrumentation is reported after each AI move (see
+          instrumentation.report), or None
+        - running: whether the window is still open
+
+    Representation Invariants:
+        - self.state in {CHOOSE_L, CHOOSE_NEUTRAL, PLACE_NEUTRAL, AI_TURN, GAME_OVER}
+        - (self.state == GAME_OVER) == (self.winner is not None)
+    """
+    board: Board
+    human: HumanPlayer
+    ai: Any
+    renderer: BoardRenderer
+    state: str
+    winner: Optional[str]
+    profile: Optional[str]
+    running: bool
+
+    # Private Instance Attributes:
+    #  - _selected: the squares clicked so far in this state, as (row, col)
+    #  - _executor: the thread that runs the AI's make_move
+    #  - _ai_move: the AI's move being chosen, or None if the AI is not thinking
+    #  - _ai_shown_at: the time.perf_counter() value at which the AI's latest move was shown
+    _selected: list[tuple[int, int]]
+    _executor: ThreadPoolExecutor
+    _ai_move: Optional[Future]
+    _ai_shown_at: float
+
+    def __init__(self, window: pygame.Surface, human: HumanPlayer, ai: Any,
+                 profile: Optional[str] = None, board: Optional[Board] = None) -> None:
+        """Initialize a game in window, starting from board (the starting board by default) with
+        red to move.
+
+        The AI's make_move is called from a background thread, so it must not handle the window's
+        events itself (for example, a MiniMaxPlayer's poll should be None).
+        """
+        self.board = Board(_copy(STARTING_BOARD)) if board is None else board
+        self.human = human
+        self.ai = ai
+        self.renderer = BoardRenderer(window)
+        self.winner = None
+        self.profile = profile
+        self.running = True
+        self._selected = []
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ai')
+        self._ai_move = None
+        self._ai_shown_at = -AI_MOVE_DELAY
+        self.state = CHOOSE_L
+        self._start_turn()
+
+    def run(self) -> Optional[str]:
+        """Run the game until the window is closed and return the winner, or None if the window
+        was closed before the game ended."""
+        clock = pygame.time.Clock()
+        while self.running:
+            self.step()
+            clock.tick(FPS)
+        self.close()
+        return self.winner
+
+    def step(self) -> None:
+        """Run one frame: handle the window's events, play the AI's move if it is ready, and draw
+        the board."""
+        for event in pygame.event.get():
+            self.handle_event(event)
+        if self.running and self.state == AI_TURN:
+            self._poll_ai()
+        if self.running:
+            self.renderer.present(self._shown_board())
+
+    def handle_event(self, event: pygame.event.Event) -> None:
+        """Act on one event from the window."""
+        if event.type == pygame.QUIT:
+            self.running = False
+        elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+            # the window was drawn over, so every cell has to be drawn again
+            self.renderer.invalidate()
+        elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            self._click(self.human.calc_row_col(event.pos))
+        elif event.type == pygame.KEYDOWN:
+            self._key(event.key)
+
+    def close(self) -> None:
+        """Stop the AI's threads. A search in progress finishes in the background."""
+        self.running = False
+        if hasattr(self.ai, 'close'):
+            # the AI may be making a move on the executor's thread, so it must not start
+            # pondering again after this
+            self.ai.close()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _click(self, square: tuple[int, int]) -> None:
+        """Act on a click on square, a (row, col) of the board."""
+        row, col = square
+        if not (0 <= row < ROWS and 0 <= col < COLS):
+            return
+        colour = self.board.board[row][col]
+        if self.state == CHOOSE_L:
+            if square in self._selected:
+                self._selected.remove(square)
+            else:
+                self._selected.append(square)
+            if len(self._selected) == 4:
+                new_board = self.human.to_board(self._selected, _copy(self.board.board), 'red')
+                self._selected = []
+                if new_board in self.board.get_valid_moves():
+                    self._play(new_board, 'black')
+                    self._set_state(CHOOSE_NEUTRAL)
+                else:
+                    self._set_state(CHOOSE_L, 'That is not a valid move. ')
+        elif self.state == CHOOSE_NEUTRAL and colour == 'black':
+            self._selected = [square]
+            self._set_state(PLACE_NEUTRAL)
+        elif self.state == PLACE_NEUTRAL:
+            if colour == 'black':
+                self._selected = [square]
+                return
+            if colour != 'white':
+                # add_piece would leave the board as it is, which is the move that skips the
+                # neutral move; only the skip keys may do that
+                self._set_state(PLACE_NEUTRAL, 'That is not a valid move. ')
+                return
+            new_board = self.human.add_piece(self._selected[0], square, _copy(self.board.board))
+            if new_board in self.board.get_valid_moves():
+                self._play(new_board, 'blue')
+                self._start_turn()
+            else:
+                self._set_state(PLACE_NEUTRAL, 'That is not a valid move. ')
+        elif self.state == GAME_OVER:
+            self.running = False
+
+    def _key(self, key: int) -> None:
+        """Act on a press of key."""
+        if self.state == CHOOSE_NEUTRAL and key in SKIP_KEYS:
+            self.board.move_type = 'blue'
+            self.board.is_red_move = False
+            self._start_turn()
+        elif self.state == PLACE_NEUTRAL and key == CANCEL_KEY:
+            self._set_state(CHOOSE_NEUTRAL)
+        elif self.state == CHOOSE_L and key == CANCEL_KEY:
+            self._set_state(CHOOSE_L)
+        elif self.state == GAME_OVER:
+            self.running = False
+
+    def _play(self, new_board: list, move_type: str) -> None:
+        """Play new_board as the next board of the game, with move_type to move next."""
+        self.board.previous_boards.append(self.board.board)
+        self.board.board = new_board
+        self.board.move_type = move_type
+        if move_type != 'black':
+            self.board.is_red_move = move_type == 'red'
+
+    def _start_turn(self) -> None:
+        """Start the turn of the player whose move self.board is at, or end the game if they have
+        no L move."""
+        if self.board.move_type != 'black' and self.board.get_valid_moves() == []:
+            self.winner = 'blue' if self.board.is_red_move else 'red'
+            self._set_state(GAME_OVER)
+            print(f'{self.winner.capitalize()} has won the game!')
+        elif self.board.is_red_move:
+            self._set_state(CHOOSE_L if self.board.move_type == 'red' else CHOOSE_NEUTRAL)
+        else:
+            self._set_state(AI_TURN)
+
+    def _poll_ai(self) -> None:
+        """Start the AI's next move if it is not thinking, and play its move if it is ready and
+        the previous one has been shown for AI_MOVE_DELAY seconds."""
+        if self._ai_move is None:
+            # the AI gets its own copy of the game, so the window can keep drawing this one
+            snapshot = Board(_copy(self.board.board), self.board.previous_boards.copy(),
+                             self.board.is_red_move, self.board.move_type)
+            self._ai_move = self._executor.submit(self.ai.make_move, snapshot)
+        elif self._ai_move.done() and time.perf_counter() - self._ai_shown_at >= AI_MOVE_DELAY:
+            new_board = self._ai_move.result()
+            self._ai_move = None
+            is_l_move = self.board.move_type != 'black'
+            instrumentation.report('AI L move' if is_l_move else 'AI neutral move', self.profile)
+            self._play(new_board, 'black' if is_l_move else 'red')
+            self._ai_shown_at = time.perf_counter()
+            self._start_turn()
+
+    def _set_state(self, state: str, message: str = '') -> None:
+        """Move to state, clearing the selection and showing message and the state's caption."""
+        self.state = state
+        if state != PLACE_NEUTRAL:
+            self._selected = []
+        if state == GAME_OVER:
+            caption = f'{self.winner.capitalize()} has won the game! Click to close'
+        else:
+            caption = message + _CAPTIONS[state]
+        pygame.display.set_caption(f'The L Game - {caption}')
+
+    def _shown_board(self) -> list:
+        """Return the board to draw: the game's board, with the squares chosen so far shown as the
+        red L while the human is choosing their L move."""
+        if self.state == CHOOSE_L and self._selected:
+            return self.human.to_board(self._selected, _copy(self.board.board), 'red')
+        return self.board.board
+
+
+def _copy(board: list) -> list:
+    """Return a copy of board that can be changed without changing board.
+
+    >>> board = [['white'] * 4 for _ in range(4)]
+    >>> _copy(board) == board and _copy(board)[0] is not board[0]
+    True
+    """
+    return [row.copy() for row in board]
@@ -10,9 +10,20 @@ University of Toronto, St. George campus. Synchronous. March 6, 2021.
 
 """
 from __future__ import annotations
-from typing import Optional
+from typing import Optional, Sequence
 from constants import STARTING_BOARD
 from board import Board
+from bitboard import Position, MOVE_CACHE
+from transposition import TranspositionTable, zobrist_hash, zobrist_update
+from symmetry import COLOUR_SWAP, SymmetryTable, transform_position
+from deadline import Deadline
+
+# Bits of GameTree._turn
+_RED_TO_MOVE = 2
+_NEUTRAL_TO_MOVE = 1
+
+# The approximate memory of one node, including its share of the history of its expansion
+NODE_BYTES = 260
 
 
 class GameTree:
@@ -21,23 +32,42 @@ class GameTree:
     Each node in the tree stores an L Game board and a boolean representing whether
     the current player (who will make the next move) is Red or Blue. This is based on A2.
 
+    A node does not hold a Board: it stores its position packed into one int (see Position.pack)
+    and its turn as two bits, and builds a Board only when the board attribute is read. The
+    previous boards of the children of one node are a single frozenset of packed positions, shared
+    by all of those children, so checking a move against them takes constant time.
+
     Instance Attributes:
-      - move: the current move (expressed in board notation, which is 4x4 of strings)
+      - board: the current board, built from the node's position each time it is read
+      - position: the bitboard form of the current board
       - is_red_move: boolean that is True when it is red's move and false if blue's
       - move_type: string that represents what piece is to be moved
       - score: the probability that white is going to win the game
     """
-    board: Board
+    __slots__ = ('_position', '_turn', '_history', 'score', '_subtrees', '_expanded')
     score: float
 
     # Private Instance Attributes:
+    #  - _position:
+    #      the current position, packed by Position.pack
+    #  - _turn:
+    #      the _RED_TO_MOVE and _NEUTRAL_TO_MOVE bits of the current turn
+    #  - _history:
+    #      the packed positions of the previous boards, which no L move may repeat: the game's
+    #      history at the root, and the siblings and parent of each other node
     #  - _subtrees:
     #      the subtrees of this tree, which represent the game trees after a possible
     #      move by the current player
+    #  - _expanded:
+    #      whether _subtrees holds a subtree for every valid move of the current player
+    _position: int
+    _turn: int
+    _history: frozenset[int]
     _subtrees: list[GameTree]
+    _expanded: bool
 
-    def __init__(self, board: Board(), score: float = 0.0) -> None:
-        """Initialize a new game tree.
+    def __init__(self, board: Optional[Board] = None, score: float = 0.0) -> None:
+        """Initialize a new game tree for board, which defaults to a new Board().
 
         Note that this initializer uses optional arguments, as illustrated below.
 
@@ -47,10 +77,40 @@ class GameTree:
         >>> game.board.is_red_move
         True
         """
-        self.board = board
+        if board is None:
+            board = Board()
+        self._position = board.position.pack()
+        self._turn = (board.is_red_move and _RED_TO_MOVE) | \
+            (board.move_type == 'black' and _NEUTRAL_TO_MOVE)
+        self._history = frozenset(board.previous_boards.keys())
         self._subtrees = []
+        self._expanded = False
         self.score = score
 
+    @property
+    def position(self) -> Position:
+        """Return the bitboard form of this tree's board."""
+        return Position.unpack(self._position)
+
+    @property
+    def is_red_move(self) -> bool:
+        """Return whether it is red's move."""
+        return bool(self._turn & _RED_TO_MOVE)
+
+    @property
+    def move_type(self) -> str:
+        """Return the kind of piece to be moved: 'red', 'blue' or 'black'."""
+        if self._turn & _NEUTRAL_TO_MOVE:
+            return 'black'
+        return 'red' if self._turn & _RED_TO_MOVE else 'blue'
+
+    @property
+    def board(self) -> Board:
+        """Return a new Board for this tree's state."""
+        return Board(self.position.to_board(),
+                     [Position.unpack(previous).to_board() for previous in self._history],
+                     self.is_red_move, self.move_type)
+
     def get_subtrees(self) -> list[GameTree]:
         """Return the subtrees of this game tree."""
         return self._subtrees
@@ -60,18 +120,167 @@ class GameTree:
 
         Return None if no subtree corresponds to that move.
         """
+        packed = Position.from_board(move).pack()
         for subtree in self._subtrees:
-            if subtree.board.board == move:
+            if subtree._position == packed:
                 return subtree
 
         return None
 
+    def expand(self) -> None:
+        """Add a subtree for every valid move from this tree's board, unless that has already been
+        done. The new subtrees are not expanded themselves.
+        """
+        if self._expanded:
+            return
+        self._expanded = True
+        moves = [move.pack() for move in self._valid_moves()]
+        # the previous boards of every child are its siblings and this tree's board
+        history = frozenset([*moves, self._position])
+        turn = _child_turn(self._turn)
+        for move in moves:
+            self._subtrees.append(_new_node(move, turn, history))
+
+    def _valid_moves(self) -> Sequence[Position]:
+        """Return the valid moves from this tree's board, as Board.get_valid_moves would."""
+        moves = MOVE_CACHE.moves(self.position, self.move_type)
+        if not self._turn & _NEUTRAL_TO_MOVE and self._history:
+            moves = [move for move in moves if move.pack() not in self._history]
+        return moves
+
+    def search(self, depth: int, table: Optional[TranspositionTable] = None,
+               deadline: Optional[Deadline] = None,
+               symmetry: Optional[SymmetryTable] = None) -> float:
+        """Score this tree by minimax depth moves deep, the same way gen_gametree does, and return
+        the score.
+
+        Subtrees are only expanded when the search reaches them, and subtrees expanded by an
+        earlier search are reused, so searching again after moving down the tree only expands the
+        new frontier. table and symmetry are used as in gen_gametree.
+
+        If deadline is given, it is checked at every node, so the search raises SearchTimeout
+        once it passes. The scores in the tree are then a mix of this search's and earlier ones,
+        until the tree is searched again; the entries stored in table are all complete.
+
+        Preconditions:
+            - depth >= 0
+        """
+        if table is None or symmetry is not None:
+            self._search(depth, table, 0, True, deadline, symmetry)
+        else:
+            key = zobrist_hash(self.position, self.is_red_move, self.move_type)
+            self._search(depth, table, key, True, deadline)
+        return self.score
+
+    def _search(self, depth: int, table: Optional[TranspositionTable], key: int,
+                is_root: bool, deadline: Optional[Deadline] = None,
+                symmetry: Optional[SymmetryTable] = None) -> None:
+        """Score this tree for search, where key is the Zobrist hash of its state, or 0 if the
+        table is keyed by the canonical states of symmetry."""
+        if deadline is not None:
+            deadline.check()
+        # the scores and moves stored under a canonical key are those of the canonical state
+        transform = 0
+        if table is not None and not is_root:
+            if symmetry is not None:
+                key, transform = symmetry.canonical(self.position, self.is_red_move,
+                                                    self.move_type)
+            entry = table.probe(key, depth)
+            if entry is not None:
+                self.score = _red_score(entry.score, transform)
+                return
+
+        if depth == 0 and not self._expanded:
+            # a leaf only needs to know whether the game is over, not what the moves are
+            is_over = not self._valid_moves()
+        else:
+            self.expand()
+            is_over = self._subtrees == []
+
+        if is_over:
+            self.score = -1.0 if self._turn & _RED_TO_MOVE else 1.0
+        elif depth == 0:
+            self.score = 0.0
+        else:
+            zobrist = table is not None and symmetry is None
+            if zobrist:
+                position = self.position
+                move_type = self.move_type
+            for subtree in self._subtrees:
+                if zobrist:
+                    child_key = zobrist_update(key, position, subtree.position, move_type)
+                else:
+                    child_key = 0
+                subtree._search(depth - 1, table, child_key, False, deadline, symmetry)
+            self._update_score()
+
+        if table is not None and not is_root:
+            _store(table, key, depth, self, transform)
+
     def add_subtree(self, subtree: GameTree) -> None:
         """Add a subtree to this game tree."""
         self._subtrees.append(subtree)
         for subtree in subtree.get_subtrees():
             subtree._update_score()
 
+    def __len__(self) -> int:
+        """Return the number of nodes in this tree.
+
+        >>> len(gen_gametree(2, Board()))
+        71
+        """
+        size = 1
+        stack = list(self._subtrees)
+        while stack:
+            tree = stack.pop()
+            size += 1
+            stack.extend(tree._subtrees)
+        return size
+
+    def prune(self, max_nodes: int) -> int:
+        """Collapse the least valuable subtrees of this tree until it has at most max_nodes nodes,
+        and return the number of nodes removed.
+
+        A collapsed subtree keeps its score but loses its own subtrees, and is expanded again by
+        the next search that reaches it. The value of a subtree is how close it is to the line of
+        play the tree expects: subtrees are collapsed in decreasing order of the number of moves
+        on their path from this tree that are not the best_subtree of their parent, and deepest
+        first among those. To budget memory instead of nodes, use max_nodes = bytes // NODE_BYTES.
+
+        Preconditions:
+            - max_nodes >= 1
+
+        >>> tree = gen_gametree(3, Board())
+        >>> len(tree), tree.prune(100), len(tree), tree.score
+        (683, 583, 100, 0.0)
+        """
+        size = len(self)
+        if size <= max_nodes:
+            return 0
+
+        # (deviations from the expected line, depth, node) of every expanded node below the root
+        candidates = []
+        stack = [(self, 0, 0)]
+        while stack:
+            tree, deviations, depth = stack.pop()
+            best = tree.best_subtree()
+            for subtree in tree._subtrees:
+                child_deviations = deviations + (subtree is not best)
+                if subtree._expanded:
+                    candidates.append((child_deviations, depth + 1, subtree))
+                    stack.append((subtree, child_deviations, depth + 1))
+        candidates.sort(key=lambda candidate: (candidate[0], candidate[1]), reverse=True)
+
+        removed = 0
+        for _, _, tree in candidates:
+            if size - removed <= max_nodes:
+                break
+            # candidates are sorted so that every node comes after its descendants
+            removed += len(tree) - 1
+            tree._subtrees = []
+            tree._expanded = False
+        return removed
+
     def __str__(self) -> str:
         """Return a string representation of this tree."""
         return self._str_indented(0)
@@ -81,11 +290,11 @@ class GameTree:
 
         The indentation level is specified by the <depth> parameter.
         """
-        if self.board.is_red_move:
+        if self.is_red_move:
             turn_desc = "Red's move"
         else:
             turn_desc = "Blue's move"
-        move_desc = f'{self.board.board} -> {turn_desc} \n'
+        move_desc = f'{self.position.to_board()} -> {turn_desc} \n'
         s = '  ' * depth + move_desc
         if self._subtrees == []:
             return s
@@ -96,44 +305,96 @@ class GameTree:
 
     def in_previous_moves(self, curr_move: list) -> bool:
         """Check if the move has been played before."""
-        if curr_move in self.board.previous_boards:
+        if Position.from_board(curr_move).pack() in self._history:
             return True
         return False
 
+    def best_subtree(self) -> Optional[GameTree]:
+        """Return the first subtree with the best score for the player to move, or None if this
+        tree has no subtrees."""
+        best = None
+        is_red_move = self._turn & _RED_TO_MOVE
+        for subtree in self._subtrees:
+            if best is None or (is_red_move and subtree.score > best.score) or \
+                    (not is_red_move and subtree.score < best.score):
+                best = subtree
+        return best
+
     def _update_score(self) -> None:
         """Updates the score of the GameTree based on the score of their subtrees. These scores are
         generated in gen_gametree
         """
-        if self.board.is_red_move and self.get_subtrees() != []:
+        if self._turn & _RED_TO_MOVE and self.get_subtrees() != []:
             self.score = max(subtree.score for subtree in self.get_subtrees())
-        elif not self.board.is_red_move and self.get_subtrees() != []:
+        elif not self._turn & _RED_TO_MOVE and self.get_subtrees() != []:
             self.score = min(subtree.score for subtree in self.get_subtrees())
         else:
             return None
 
 
-def gen_gametree(depth: int, board: Board) -> GameTree:
+def gen_gametree(depth: int, board: Board, table: Optional[TranspositionTable] = None,
+                 symmetry: Optional[SymmetryTable] = None) -> GameTree:
     """Generates a GameTree and calculates the appropriate score
 
+    If table is given, any position below the root that it already holds to a great enough depth
+    is not expanded again: its subtree is a single GameTree with the stored score. Every position
+    below the root that is expanded is stored in table.
+
+    If symmetry is given, table is keyed by canonical state (see symmetry.py) instead of by
+    Zobrist hash, so a position is not expanded again in any of its up to 16 symmetric forms. A
+    table must always be keyed the same way.
+
+    >>> board = Board(STARTING_BOARD)
+    >>> tree = gen_gametree(4, board, TranspositionTable(), SymmetryTable())
+    >>> tree.score == gen_gametree(4, board, TranspositionTable()).score
+    True
+
+    The root's moves depend on the previous boards of the game, so the root is never looked up in
+    or stored to table.
+
     Preconditions:
         - depth >= 0
     """
     gametree_so_far = GameTree(board)
-    if len(board.get_valid_moves()) == 0:
-        if board.is_red_move:
-            gametree_so_far.score = -1.0
-        else:
-            gametree_so_far.score = 1.0
-    elif depth != 0:
-        for move in board.get_valid_moves():
-            if board.move_type != 'black':
-                new_board = Board(move, board.get_valid_moves() + [board.board], board.is_red_move,
-                                  'black')
-            elif board.is_red_move:
-                new_board = Board(move, board.get_valid_moves() + [board.board], False,
-                                  'blue')
-            else:
-                new_board = Board(move, board.get_valid_moves() + [board.board], True,
-                                  'red')
-            gametree_so_far.add_subtree(gen_gametree(depth - 1, new_board))
+    gametree_so_far.search(depth, table, symmetry=symmetry)
     return gametree_so_far
+
+
+def _new_node(position: int, turn: int, history: frozenset[int]) -> GameTree:
+    """Return a new unexpanded GameTree for the given packed position and turn bits, sharing the
+    frozenset history as its previous boards."""
+    tree = GameTree.__new__(GameTree)
+    tree._position = position
+    tree._turn = turn
+    tree._history = history
+    tree._subtrees = []
+    tree._expanded = False
+    tree.score = 0.0
+    return tree
+
+
+def _child_turn(turn: int) -> int:
+    """Return the turn bits after a move is made on the turn given by the bits turn."""
+    if turn & _NEUTRAL_TO_MOVE:
+        return (turn & _RED_TO_MOVE) ^ _RED_TO_MOVE
+    return turn | _NEUTRAL_TO_MOVE
+
+
+def _store(table: TranspositionTable, key: int, depth: int, tree: GameTree,
+           transform: int = 0) -> None:
+    """Store the score and best move of tree, searched depth moves deep, in table, taken to the
+    canonical state by transform."""
+    best_subtree = tree.best_subtree()
+    best_move = None if best_subtree is None else best_subtree.position
+    if transform and best_move is not None:
+        best_move = transform_position(best_move, transform)
+    table.store(key, depth, _red_score(tree.score, transform), best_move)
+
+
+def _red_score(score: float, transform: int) -> float:
+    """Return the score for red of a state, given the score for red of the state transform
+    takes it to, or the other way around.
+
+    A colour swap swaps the players, so it turns a win for red into a win for blue.
+    """
+    return -score if transform & COLOUR_SWAP else score
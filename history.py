@@ -0,0 +1,119 @@
+"""
+CSC111 2021 Final Project - The L Game
+
+This file stores the PositionHistory class, the record of the boards already played in a game that
+Board uses to stop an L move from repeating one of them.
+
+Boards are stored as the int keys of Position.pack rather than as nested lists, so checking a move
+against the history is a single hash lookup however long the game has been.
+
+This file is Copyright (c) 2021 Siddarth Dagar, Daniel Zhu, and Bradley Mathi.
+"""
+from __future__ import annotations
+from collections import deque
+from typing import Iterable, Iterator, Optional, Union
+from bitboard import Position
+
+
+class PositionHistory:
+    """The previous boards of a game, with constant time membership tests.
+
+    Boards can be given either as nested lists of colour strings or as Positions. Appending a
+    board that is already in the history does not store it twice, so without a window the history
+    never holds more than one entry per distinct position. With a window, only the window most
+    recently appended boards are remembered.
+
+    Instance Attributes:
+        - window: the number of most recent boards remembered, or None to remember every board
+
+    Representation Invariants:
+        - self.window is None or self.window >= 1
+        - self.window is None or len(self) <= self.window
+
+    >>> from constants import STARTING_BOARD
+    >>> history = PositionHistory([STARTING_BOARD])
+    >>> STARTING_BOARD in history, Position.from_board(STARTING_BOARD) in history
+    (True, True)
+    >>> [['white'] * 4] * 4 in history
+    False
+    """
+    window: Optional[int]
+
+    # Private Instance Attributes:
+    #  - _counts: how many times each packed position appears in _order, or once for every
+    #      position appended when there is no window
+    #  - _order: the packed positions in the window, oldest first, or None if there is no window
+    _counts: dict[int, int]
+    _order: Optional[deque[int]]
+
+    def __init__(self, boards: Iterable[Union[list, Position]] = (),
+                 window: Optional[int] = None) -> None:
+        """Initialize a history holding boards, oldest first, that remembers at most window boards.
+
+        Preconditions:
+            - window is None or window >= 1
+        """
+        self.window = window
+        self._counts = {}
+        self._order = None if window is None else deque()
+        for board in boards:
+            self.append(board)
+
+    def append(self, board: Union[list, Position]) -> None:
+        """Record board as the most recent board played.
+
+        >>> history = PositionHistory(window=2)
+        >>> for position in [Position(1, 2, 12), Position(1, 2, 20), Position(1, 2, 36)]:
+        ...     history.append(position)
+        >>> Position(1, 2, 12) in history, len(history)
+        (False, 2)
+        """
+        key = _key(board)
+        if self._order is None:
+            self._counts[key] = 1
+            return
+        self._order.append(key)
+        self._counts[key] = self._counts.get(key, 0) + 1
+        if len(self._order) > self.window:
+            oldest = self._order.popleft()
+            if self._counts[oldest] == 1:
+                del self._counts[oldest]
+            else:
+                self._counts[oldest] -= 1
+
+    def keys(self) -> Iterator[int]:
+        """Return an iterator over the distinct boards remembered, as keys of Position.pack."""
+        return iter(self._counts)
+
+    def clear(self) -> None:
+        """Forget every board."""
+        self._counts.clear()
+        if self._order is not None:
+            self._order.clear()
+
+    def copy(self) -> PositionHistory:
+        """Return a new history remembering the same boards with the same window."""
+        history = PositionHistory(window=self.window)
+        history._counts = self._counts.copy()
+        if self._order is not None:
+            history._order = self._order.copy()
+        return history
+
+    def __contains__(self, board: Union[list, Position]) -> bool:
+        """Return whether board is remembered by this history."""
+        return _key(board) in self._counts
+
+    def __len__(self) -> int:
+        """Return the number of distinct boards remembered."""
+        return len(self._counts)
+
+    def __iter__(self) -> Iterator[list[list[str]]]:
+        """Return an iterator over the distinct boards remembered, as new nested lists."""
+        return (Position.unpack(key).to_board() for key in self._counts)
+
+
+def _key(board: Union[list, Position]) -> int:
+    """Return the packed position of board, which is a Position or a nested list board."""
+    if isinstance(board, Position):
+        return board.pack()
+    return Position.from_board(board).pack()
@@ -0,0 +1,245 @@
+"""
+CSC111 2021 Final Project - The L Game
+
+This file stores the search instrumentation: counters and timings of the functions on
+MiniMaxPlayer's search path, for finding out where the time of a slow move goes.
+
+Nothing is measured until enable() is called. enable() replaces each instrumented function with a
+wrapper that counts and times its calls, and disable() puts the original functions back, so the
+instrumentation costs nothing at all while it is off.
+
+The instrumented functions are gen_gametree, GameTree.search, GameTree._search (whose depth
+argument gives the per-depth counts), GameTree.expand, GameTree.add_subtree,
+GameTree._update_score, Board.get_valid_moves and MoveCache.moves. Every function's time is split
+into its total time and its own time, which leaves out the time spent in the other instrumented
+functions it calls; the own time of GameTree.expand is the tree construction, and the own time of
+MoveCache.moves is the move generation.
+
+The calls in progress are tracked separately in every thread, so a search on one thread (such as
+the AI's move in the game window) and a search on another (such as MiniMaxPlayer's pondering) do
+not mix up each other's own times. STATS adds up the calls of every thread, so the statistics of a
+move made while pondering include the pondering.
+
+This file is Copyright (c) 2021 Siddarth Dagar, Daniel Zhu, and Bradley Mathi.
+"""
+from __future__ import annotations
+import functools
+import json
+import sys
+import threading
+import time
+from typing import Any, Callable, Optional
+import gametree
+from board import Board
+from bitboard import MoveCache
+from gametree import GameTree
+
+# (owner, attribute name, short name) of every instrumented function
+_TARGETS = ((gametree, 'gen_gametree', 'gen_gametree'),
+            (GameTree, 'search', 'search'),
+            (GameTree, '_search', 'visit'),
+            (GameTree, 'expand', 'expand'),
+            (GameTree, 'add_subtree', 'add_subtree'),
+            (GameTree, '_update_score', 'update_score'),
+            (Board, 'get_valid_moves', 'get_valid_moves'),
+            (MoveCache, 'moves', 'generate_moves'))
+
+
+class SearchStats:
+    """The counters and timings collected while the instrumentation is on.
+
+    Instance Attributes:
+        - calls: the number of calls of each instrumented function, by short name
+        - total_time: the seconds spent in each function, including the functions it calls (a
+          recursive call is counted only in the time of the outermost call)
+        - own_time: the seconds spent in each function, leaving out the other instrumented
+          functions it calls
+        - children: the number of subtrees made by GameTree.expand
+        - depth_visits: the number of GameTree._search calls at each remaining depth
+        - depth_time: the seconds spent in GameTree._search calls at each remaining depth,
+          including the deeper calls they make
+
+    Representation Invariants:
+        - all(self.own_time[name] <= self.total_time[name] for name in self.own_time)
+    """
+    calls: dict[str, int]
+    total_time: dict[str, float]
+    own_time: dict[str, float]
+    children: int
+    depth_visits: dict[int, int]
+    depth_time: dict[int, float]
+
+    def __init__(self) -> None:
+        """Initialize empty statistics."""
+        self.reset()
+
+    def reset(self) -> None:
+        """Set every counter and timing back to zero."""
+        self.calls = {}
+        self.total_time = {}
+        self.own_time = {}
+        self.children = 0
+        self.depth_visits = {}
+        self.depth_time = {}
+
+    def summary(self) -> dict[str, Any]:
+        """Return the statistics as a dictionary that can be written as JSON.
+
+        >>> stats = SearchStats()
+        >>> stats.calls['expand'], stats.children = 4, 10
+        >>> stats.summary()['branching_factor']
+        2.5
+        """
+        expansions = self.calls.get('expand', 0)
+        return {'calls': dict(self.calls),
+                'total_time': dict(self.total_time),
+                'own_time': dict(self.own_time),
+                'nodes': sum(self.depth_visits.values()),
+                'branching_factor': self.children / expansions if expansions else 0.0,
+                'move_generation_time': self.own_time.get('generate_moves', 0.0),
+                'tree_construction_time': self.own_time.get('expand', 0.0),
+                'depths': {depth: {'visits': self.depth_visits[depth],
+                                   'time': self.depth_time[depth]}
+                           for depth in sorted(self.depth_visits, reverse=True)}}
+
+
+# The statistics collected by the wrappers
+STATS = SearchStats()
+
+# The original functions replaced by enable, by short name
+_originals: dict[str, Callable] = {}
+# Held while a wrapper adds a call to STATS
+_stats_lock = threading.Lock()
+
+
+class _CallsInProgress(threading.local):
+    """The instrumented calls in progress on one thread.
+
+    Instance Attributes:
+        - child_time: for each instrumented call in progress, innermost last, the time spent in
+          instrumented calls made by it so far
+        - active: the number of calls in progress of each instrumented function, by short name
+    """
+    child_time: list[float]
+    active: dict[str, int]
+
+    def __init__(self) -> None:
+        """Initialize the calls in progress of a thread, which is called once in each thread
+        that uses them."""
+        self.child_time = []
+        self.active = {}
+
+
+_in_progress = _CallsInProgress()
+
+
+def enabled() -> bool:
+    """Return whether the instrumentation is on."""
+    return _originals != {}
+
+
+def enable() -> None:
+    """Turn the instrumentation on, replacing every instrumented function with a wrapper."""
+    if enabled():
+        return
+    for owner, attribute, name in _TARGETS:
+        original = getattr(owner, attribute)
+        _originals[name] = original
+        _replace(owner, attribute, original, _wrap(original, name))
+
+
+def disable() -> None:
+    """Turn the instrumentation off, putting the original functions back."""
+    for owner, attribute, name in _TARGETS:
+        if name in _originals:
+            _replace(owner, attribute, getattr(owner, attribute), _originals.pop(name))
+
+
+def _replace(owner: Any, attribute: str, old: Callable, new: Callable) -> None:
+    """Set owner.attribute to new. If owner is a module, also rebind old to new in every module
+    that imported it by name, so that callers of old see new."""
+    setattr(owner, attribute, new)
+    if isinstance(owner, type):
+        return
+    for module in list(sys.modules.values()):
+        if module is not owner and getattr(module, attribute, None) is old:
+            setattr(module, attribute, new)
+
+
+def _wrap(function: Callable, name: str) -> Callable:
+    """Return a wrapper of function that records its calls in STATS under name."""
+    is_visit = name == 'visit'
+    is_expand = name == 'expand'
+
+    @functools.wraps(function)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        """Call function, counting and timing the call."""
+        if is_expand:
+            before = len(args[0].get_subtrees())
+        in_progress = _in_progress
+        child_time, active = in_progress.child_time, in_progress.active
+        child_time.append(0.0)
+        active[name] = active.get(name, 0) + 1
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            inner = child_time.pop()
+            if child_time:
+                child_time[-1] += elapsed
+            active[name] -= 1
+            outermost = active[name] == 0
+            with _stats_lock:
+                stats = STATS
+                stats.calls[name] = stats.calls.get(name, 0) + 1
+                if outermost:
+                    stats.total_time[name] = stats.total_time.get(name, 0.0) + elapsed
+                else:
+                    stats.total_time.setdefault(name, 0.0)
+                stats.own_time[name] = stats.own_time.get(name, 0.0) + elapsed - inner
+                if is_expand:
+                    stats.children += len(args[0].get_subtrees()) - before
+                elif is_visit:
+                    depth = args[1]
+                    stats.depth_visits[depth] = stats.depth_visits.get(depth, 0) + 1
+                    stats.depth_time[depth] = stats.depth_time.get(depth, 0.0) + elapsed
+
+    return wrapper
+
+
+def format_summary(summary: dict[str, Any]) -> str:
+    """Return a readable multi-line description of summary, as returned by SearchStats.summary.
+
+    >>> print(format_summary(SearchStats().summary()))
+    0 nodes, branching factor 0.00, move generation 0.0ms, tree construction 0.0ms
+    """
+    lines = [f"{summary['nodes']} nodes, branching factor {summary['branching_factor']:.2f}, "
+             f"move generation {summary['move_generation_time'] * 1000:.1f}ms, "
+             f"tree construction {summary['tree_construction_time'] * 1000:.1f}ms"]
+    for depth, values in summary['depths'].items():
+        lines.append(f"  depth {depth}: {values['visits']} nodes, {values['time'] * 1000:.1f}ms")
+    for name in sorted(summary['calls']):
+        lines.append(f"  {name}: {summary['calls'][name]} calls, "
+                     f"{summary['total_time'][name] * 1000:.1f}ms total, "
+                     f"{summary['own_time'][name] * 1000:.1f}ms own")
+    return '\n'.join(lines)
+
+
+def report(label: str, destination: Optional[str]) -> None:
+    """Report the statistics collected since the last report, then reset them.
+
+    If destination is '-' a readable summary headed by label is printed; otherwise the summary is
+    appended to the file destination as one line of JSON, with label stored under 'move'. Nothing
+    is done if destination is None.
+    """
+    if destination is None:
+        return
+    with _stats_lock:
+        summary = STATS.summary()
+        STATS.reset()
+    if destination == '-':
+        print(f'{label}: {format_summary(summary)}')
+    else:
+        with open(destination, 'a') as file:
+            file.write(json.dumps({'move': label, **summary}) + '\n')
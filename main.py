@@ -5,17 +5,32 @@ This is the main file, which is used to run the L Game and allows for the user t
 
 This file is Copyright (c) 2021 Siddarth Dagar, Daniel Zhu, and Bradley Mathi.
 """
+import sys
+from typing import Optional
+import pygame
+import instrumentation
 from player import *
 from gametree import GameTree
+from gameloop import GameLoop
 
-WIN = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption('The L Game')
+# The seconds the AI may think about each move, the greatest depth it searches to, and the most
+# game tree nodes it keeps between moves
+AI_TIME_LIMIT = 1.0
+AI_MAX_DEPTH = 12
+AI_MAX_NODES = 200000
 
 
-def main(ai: str) -> None:
+def main(ai: str, profile: Optional[str] = None) -> None:
     """
     This is the main function that allows for a user to play against an AI of their choice
 
+    The game runs in a pygame window (see GameLoop), opened here rather than when this file is
+    imported, with the AI choosing its moves in a background thread so the window keeps
+    responding while it thinks.
+
+    If profile is given, the search instrumentation is turned on and a summary of each of the AI's
+    moves is printed (if profile is '-') or appended to the file profile.
+
     Preconditions:
         - ai == '1' or ai == '2'
     """
@@ -27,68 +42,30 @@ def main(ai: str) -> None:
     if ai == '1':
         p2 = RandomPlayer(g)
     elif ai == '2':
-        p2 = MiniMaxPlayer(3, False)
+        # the AI deepens its search until its time is up, and keeps searching in the background
+        # while the human chooses their move
+        p2 = MiniMaxPlayer(AI_MAX_DEPTH, False, max_nodes=AI_MAX_NODES, time_limit=AI_TIME_LIMIT,
+                           ponder=True)
     else:
         print('This is not a valid input')
         exit()
+    if profile is not None:
+        instrumentation.enable()
 
-    while len(board.get_valid_moves()) != 0:
-        board.draw_board(WIN)
-        board.draw_pieces(WIN)
-        pygame.display.update()
-        # L Piece Red Move
-        valid_moves = board.get_valid_moves()
-        new_board = p1.make_move(valid_moves, board.board, 'red')
-        board.previous_boards.append(board.board)
-        board.move_type = 'black'
-        board.board = new_board
-        board.draw_pieces(WIN)
-        pygame.display.update()
-
-        # Neutral Piece Red Move
-        yn = input('Would you like to move a neutral piece? "Y" for yes, "N" for no')
-        if yn == "Y":
-            valid_moves = board.get_valid_moves()
-            coords = p1.select_square()
-            new_board = p1.move_neutral(valid_moves, board.board, coords)
-            board.previous_boards.append(board.board)
-            board.board = new_board
-            board.draw_pieces(WIN)
-            pygame.display.update()
-        board.move_type = 'blue'
-
-        # L Piece Blue Move
-        valid_moves = board.get_valid_moves()
-        new_board = p2.make_move(board)
-        board.previous_boards.append(board.board)
-        board.move_type = 'black'
-        pygame.time.wait(1000)
-        board.board = new_board
-        board.draw_pieces(WIN)
-        pygame.display.update()
-
-        # Neutral Piece Blue Move
-        valid_moves = board.get_valid_moves()
-        new_board = p2.make_move(board)
-        board.previous_boards.append(board.board)
-        board.move_type = 'red'
-        pygame.time.wait(1000)
-        board.board = new_board
-        board.draw_pieces(WIN)
-        pygame.display.update()
-
-    # Checks and prints winner
-    if len(board.get_valid_moves()) == 0:
-        winner = board.is_red_move
-        if winner == 'red':
-            print('Blue has won the game!')
-        elif winner == 'blue':
-            print('Red has won the game!')
+    window = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption('The L Game')
+    GameLoop(window, p1, p2, profile, board).run()
 
 
 if __name__ == '__main__':
+    # python main.py --profile prints a summary of every AI move, and python main.py --profile FILE
+    # appends them to FILE as JSON lines
+    profile_to = None
+    if '--profile' in sys.argv:
+        index = sys.argv.index('--profile')
+        profile_to = sys.argv[index + 1] if index + 1 < len(sys.argv) else '-'
     ai = input('What player would you like to play against? This is an integer from 1 to 4. \n'
                '1) Random Player \n'
                '2) MiniMax Player \n')
 
-    main(ai)
+    main(ai, profile_to)
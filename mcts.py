@@ -0,0 +1,287 @@
+"""
+CSC111 2021 Final Project - The L Game
+
+This file stores the MCTSTree class, the search tree used by MCTSPlayer for Monte Carlo tree search
+with the UCT selection rule.
+
+The nodes are not Python objects: node i is entry i of a set of flat arrays preallocated when the
+tree is created (visit counts, wins, first child and next sibling indices, and the node's
+position). This keeps the memory of a node to a few dozen bytes, so very large trees fit in memory
+and never trigger the garbage collector.
+
+This file is Copyright (c) 2021 Siddarth Dagar, Daniel Zhu, and Bradley Mathi.
+"""
+from __future__ import annotations
+import math
+import random
+import time
+from array import array
+from typing import Optional
+from bitboard import Position, next_turn, valid_moves
+
+# Bits of MCTSTree._flags
+_RED_TO_MOVE = 1
+_NEUTRAL_TO_MOVE = 2
+_RED_MOVED = 4
+_EXPANDED = 8
+
+_NO_NODE = -1
+
+
+class MCTSTree:
+    """A Monte Carlo search tree stored in preallocated arrays.
+
+    The wins of a node are counted for the player who made the move into it, with a drawn playout
+    counting as half a win.
+
+    Instance Attributes:
+        - capacity: the most nodes the tree can hold
+        - size: the number of array entries in use
+        - root: the index of the node for the current game state
+        - exploration: the UCT exploration constant
+        - max_playout_moves: the number of moves after which a playout is called a draw
+        - playouts: the number of playouts run by the latest call to run
+        - playouts_per_second: the playout rate of the latest call to run
+
+    Representation Invariants:
+        - 0 <= self.root < self.size <= self.capacity
+    """
+    capacity: int
+    size: int
+    root: int
+    exploration: float
+    max_playout_moves: int
+    playouts: int
+    playouts_per_second: float
+
+    # Private Instance Attributes:
+    #  - _visits: the number of playouts through each node
+    #  - _wins: the wins of each node's mover over those playouts
+    #  - _first_child: the index of each node's first child, or _NO_NODE
+    #  - _next_sibling: the index of each node's next sibling, or _NO_NODE
+    #  - _red, _blue, _neutral: the masks of each node's position
+    #  - _flags: each node's _RED_TO_MOVE, _NEUTRAL_TO_MOVE, _RED_MOVED and _EXPANDED bits
+    #  - _rng: the random number generator for playouts
+    _visits: array
+    _wins: array
+    _first_child: array
+    _next_sibling: array
+    _red: array
+    _blue: array
+    _neutral: array
+    _flags: array
+    _rng: random.Random
+
+    def __init__(self, position: Position, is_red_move: bool, move_type: str,
+                 capacity: int = 1 << 18, seed: Optional[int] = None) -> None:
+        """Initialize a tree holding at most capacity nodes, with a root for the given state.
+
+        Preconditions:
+            - capacity >= 1
+            - move_type in {'red', 'blue', 'black'}
+        """
+        self.capacity = capacity
+        self.exploration = math.sqrt(2)
+        self.max_playout_moves = 400
+        self.playouts = 0
+        self.playouts_per_second = 0.0
+        self._visits = array('L', [0]) * capacity
+        self._wins = array('d', [0.0]) * capacity
+        self._first_child = array('l', [_NO_NODE]) * capacity
+        self._next_sibling = array('l', [_NO_NODE]) * capacity
+        self._red = array('H', [0]) * capacity
+        self._blue = array('H', [0]) * capacity
+        self._neutral = array('H', [0]) * capacity
+        self._flags = array('B', [0]) * capacity
+        self._rng = random.Random(seed)
+        self.set_root(position, is_red_move, move_type)
+
+    def set_root(self, position: Position, is_red_move: bool, move_type: str) -> None:
+        """Throw away every node and start again from a root for the given state."""
+        self.size = 0
+        self.root = self._add_node(position, is_red_move, move_type, not is_red_move)
+
+    def advance(self, position: Position, is_red_move: bool, move_type: str) -> bool:
+        """Make the node for the given state the root, keeping its subtree.
+
+        The state is looked for up to 3 moves below the current root. Return whether it was found;
+        if not, the tree starts again from a new root.
+        """
+        frontier = [self.root]
+        for _ in range(4):
+            next_frontier = []
+            for node in frontier:
+                if self.state(node) == (position, is_red_move, move_type):
+                    self.root = node
+                    if self.size > self.capacity * 3 // 4:
+                        self._compact()
+                    return True
+                next_frontier.extend(self.children(node))
+            frontier = next_frontier
+        self.set_root(position, is_red_move, move_type)
+        return False
+
+    def state(self, node: int) -> tuple[Position, bool, str]:
+        """Return (position, is_red_move, move_type) of node."""
+        flags = self._flags[node]
+        is_red_move = bool(flags & _RED_TO_MOVE)
+        if flags & _NEUTRAL_TO_MOVE:
+            move_type = 'black'
+        else:
+            move_type = 'red' if is_red_move else 'blue'
+        return Position(self._red[node], self._blue[node], self._neutral[node]), is_red_move, \
+            move_type
+
+    def children(self, node: int) -> list[int]:
+        """Return the indices of the children of node."""
+        result = []
+        child = self._first_child[node]
+        while child != _NO_NODE:
+            result.append(child)
+            child = self._next_sibling[child]
+        return result
+
+    def visits(self, node: int) -> int:
+        """Return the number of playouts that went through node."""
+        return self._visits[node]
+
+    def win_rate(self, node: int) -> float:
+        """Return the fraction of playouts through node won by the player who moved into it."""
+        return self._wins[node] / self._visits[node] if self._visits[node] else 0.0
+
+    def run(self, iterations: Optional[int] = None, time_limit: Optional[float] = None) -> int:
+        """Run playouts from the root until iterations playouts have been run or time_limit
+        seconds have passed, whichever comes first, and return the number run.
+
+        Preconditions:
+            - iterations is not None or time_limit is not None
+        """
+        start = time.perf_counter()
+        deadline = None if time_limit is None else start + time_limit
+        count = 0
+        while (iterations is None or count < iterations) and \
+                (deadline is None or count % 16 != 0 or time.perf_counter() < deadline):
+            self._iterate()
+            count += 1
+        elapsed = time.perf_counter() - start
+        self.playouts = count
+        self.playouts_per_second = count / elapsed if elapsed > 0 else 0.0
+        return count
+
+    def best_move(self, moves: Optional[list[Position]] = None) -> Optional[Position]:
+        """Return the most visited move from the root, out of moves if they are given (the first
+        of moves if none of them have been visited). Return None if there are no moves.
+        """
+        best, best_visits = None, -1
+        for child in self.children(self.root):
+            position = self.state(child)[0]
+            if (moves is None or position in moves) and self._visits[child] > best_visits:
+                best, best_visits = position, self._visits[child]
+        if best is None and moves:
+            return moves[0]
+        return best
+
+    def _add_node(self, position: Position, is_red_move: bool, move_type: str,
+                  red_moved: bool) -> int:
+        """Add a node for the given state with no children and return its index."""
+        node = self.size
+        self.size += 1
+        self._visits[node] = 0
+        self._wins[node] = 0.0
+        self._first_child[node] = self._next_sibling[node] = _NO_NODE
+        self._red[node], self._blue[node], self._neutral[node] = position
+        self._flags[node] = (is_red_move and _RED_TO_MOVE) | \
+            (move_type == 'black' and _NEUTRAL_TO_MOVE) | (red_moved and _RED_MOVED)
+        return node
+
+    def _expand(self, node: int) -> bool:
+        """Add a child to node for every valid move, unless the tree does not have room for them.
+        Return whether node is expanded afterwards.
+        """
+        position, is_red_move, move_type = self.state(node)
+        moves = valid_moves(position, move_type)
+        if self.size + len(moves) > self.capacity:
+            return False
+        child_red, child_type = next_turn(is_red_move, move_type)
+        previous = _NO_NODE
+        for move in moves:
+            child = self._add_node(move, child_red, child_type, is_red_move)
+            if previous == _NO_NODE:
+                self._first_child[node] = child
+            else:
+                self._next_sibling[previous] = child
+            previous = child
+        self._flags[node] |= _EXPANDED
+        return True
+
+    def _select(self, node: int) -> int:
+        """Return the child of node with the highest UCT value, trying unvisited children first."""
+        log_visits = math.log(self._visits[node])
+        best, best_value = _NO_NODE, -1.0
+        child = self._first_child[node]
+        while child != _NO_NODE:
+            visits = self._visits[child]
+            if visits == 0:
+                return child
+            value = self._wins[child] / visits + \
+                self.exploration * math.sqrt(log_visits / visits)
+            if value > best_value:
+                best, best_value = child, value
+            child = self._next_sibling[child]
+        return best
+
+    def _iterate(self) -> None:
+        """Run one selection, expansion, playout and backpropagation step."""
+        node = self.root
+        path = [node]
+        while self._flags[node] & _EXPANDED and self._first_child[node] != _NO_NODE:
+            node = self._select(node)
+            path.append(node)
+        if not self._flags[node] & _EXPANDED and (self._visits[node] > 0 or node == self.root) \
+                and self._expand(node) and self._first_child[node] != _NO_NODE:
+            node = self._first_child[node]
+            path.append(node)
+
+        red_won = self._playout(*self.state(node))
+        for node in path:
+            self._visits[node] += 1
+            if red_won is None:
+                self._wins[node] += 0.5
+            elif red_won == bool(self._flags[node] & _RED_MOVED):
+                self._wins[node] += 1.0
+
+    def _playout(self, position: Position, is_red_move: bool, move_type: str) -> Optional[bool]:
+        """Play random moves from the given state and return whether red won, or None if the
+        playout reached max_playout_moves first."""
+        choice = self._rng.choice
+        for _ in range(self.max_playout_moves):
+            moves = valid_moves(position, move_type)
+            if moves == []:
+                return not is_red_move
+            position = choice(moves)
+            is_red_move, move_type = next_turn(is_red_move, move_type)
+        return None
+
+    def _compact(self) -> None:
+        """Move the root's subtree to the front of the arrays, freeing the nodes of every branch
+        that was not played."""
+        old_to_new = {self.root: 0}
+        order = [self.root]
+        i = 0
+        while i < len(order):
+            for child in self.children(order[i]):
+                old_to_new[child] = len(order)
+                order.append(child)
+            i += 1
+
+        arrays = (self._visits, self._wins, self._red, self._blue, self._neutral, self._flags)
+        for values in arrays:
+            kept = [values[old] for old in order]
+            values[:len(kept)] = array(values.typecode, kept)
+        first_child = [self._first_child[old] for old in order]
+        next_sibling = [self._next_sibling[old] for old in order]
+        for new in range(len(order)):
+            self._first_child[new] = old_to_new.get(first_child[new], _NO_NODE)
+            self._next_sibling[new] = old_to_new.get(next_sibling[new], _NO_NODE)
+        self.root = 0
+        self.size = len(order)
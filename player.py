@@ -9,10 +9,18 @@ University of Toronto, St. George campus. Synchronous. March 6, 2021.
 
 """
 from gametree import *
-from typing import Optional
+from typing import Callable, Optional
+import math
 import random
+import threading
 from constants import *
-import pygame
+from bitboard import Position, next_turn
+from transposition import TranspositionTable
+from search import AlphaBetaSearch
+from symmetry import SymmetryTable
+from deadline import Deadline, SearchTimeout
+from mcts import MCTSTree
+from tablebase import Tablebase, TABLEBASE_FILE, WIN, LOSS
 
 
 class Player:
@@ -102,6 +110,7 @@ class HumanPlayer(Player):
             - valid_moves != []
             - colour == 'red' or colour == 'blue'
         """
+        import pygame
         run = True
         lst_so_far = new_board = []
         clock = pygame.time.Clock()
@@ -136,6 +145,7 @@ class HumanPlayer(Player):
         """
         Returns a tuple representing the row and column of the selected square in the pygame window
         """
+        import pygame
         run = True
         clock = pygame.time.Clock()
         coords = (0, 0)
@@ -165,6 +175,7 @@ class HumanPlayer(Player):
             - 0 <= del_coords[0] <= ROWS
             - 0 <= del_coords[1] <= COLS
         """
+        import pygame
         run = True
         clock = pygame.time.Clock()
         new_board = board
@@ -212,89 +223,461 @@ class RandomPlayer(Player):
 class MiniMaxPlayer(Player):
     """
     An L Game AI who employs a mini-max strategy.
+
+    With a time limit, the player searches to depth 1, then 2, and so on until the time runs out
+    or depth is reached, and plays the best move of the deepest search that finished.
+
+    A pondering player keeps searching in a background thread while its opponent chooses their
+    move, starting with the replies it expects the opponent to play. When the opponent's move
+    arrives, the pondered part of the game tree is kept if it holds that move (a ponder hit) and
+    thrown away otherwise.
+
+    Instance Attributes:
+        - depth: the depth searched, or the greatest depth searched if there is a time limit
+        - is_red_player: whether this player plays red
+        - table: the transposition table kept for the whole game
+        - max_nodes: the most nodes the game tree may keep between moves, or None for no limit
+        - time_limit: the seconds allowed for each move, or None to always search to depth
+        - poll: a function called regularly during a timed search, or None
+        - ponder: whether the player searches during the opponent's turn
+        - searched_depth: the depth of the search that chose the latest move
+        - ponder_hits: the number of moves for which the pondered tree held the opponent's move
     """
     depth: int
     is_red_player: bool
-
-    def __init__(self, depth: int, is_red_player: bool) -> None:
+    table: TranspositionTable
+    max_nodes: Optional[int]
+    time_limit: Optional[float]
+    poll: Optional[Callable[[], object]]
+    ponder: bool
+    searched_depth: int
+    ponder_hits: int
+
+    # Private Instance Attributes:
+    #  - _ponder_thread: the thread pondering, or None if the player is not pondering
+    #  - _ponder_deadline: the deadline that stops the pondering thread when cancelled
+    #  - _pondered_depth: the depth to which every opponent reply from the pondered node has
+    #      been searched, counting the opponent's L move
+    #  - _ponder_lock: held while the pondering thread is started or stopped, which may happen
+    #      from different threads
+    #  - _closed: whether close has been called, after which the player never ponders again
+    #  - _symmetry: the canonical states the table is keyed by, or None to key it by Zobrist hash
+    _ponder_thread: Optional[threading.Thread]
+    _ponder_deadline: Optional[Deadline]
+    _pondered_depth: int
+    _ponder_lock: threading.Lock
+    _closed: bool
+    _symmetry: Optional[SymmetryTable]
+
+    def __init__(self, depth: int, is_red_player: bool, table_size: int = 1 << 16,
+                 max_nodes: Optional[int] = None, time_limit: Optional[float] = None,
+                 poll: Optional[Callable[[], object]] = None, ponder: bool = False,
+                 symmetric: bool = False) -> None:
         """Initialize this player.
 
+        The player keeps a transposition table of at most table_size positions for the whole
+        game, so positions searched on one move are not searched again on the next. If max_nodes
+        is given, the game tree kept between moves is pruned to at most max_nodes nodes after
+        every move (see GameTree.prune), which a pondering player does at the start of pondering,
+        and pondering stops before it would grow the tree much past max_nodes.
+
+        If time_limit is given, each move is searched by iterative deepening for at most about
+        time_limit seconds, calling poll (such as pygame.event.pump, to keep a window
+        responsive) every few hundred nodes. A search to depth 1 is always finished.
+
+        If symmetric is True, the transposition table is keyed by canonical state (see
+        gen_gametree), so symmetric positions share their entries.
+
         Preconditions:
             - game_tree represents a game tree at the initial state
             - depth >= 0
+            - table_size > 0
+            - max_nodes is None or max_nodes >= 1
+            - time_limit is None or time_limit >= 0
         """
         self.is_red_player = is_red_player
         self.depth = depth
+        self.table = TranspositionTable(table_size)
+        self.max_nodes = max_nodes
+        self.time_limit = time_limit
+        self.poll = poll
+        self.ponder = ponder
+        self.searched_depth = 0
+        self.ponder_hits = 0
+        self._game_tree = None
+        self._ponder_thread = None
+        self._ponder_deadline = None
+        self._pondered_depth = 0
+        self._ponder_lock = threading.Lock()
+        self._closed = False
+        self._symmetry = SymmetryTable() if symmetric else None
+
+    def __getstate__(self) -> dict:
+        """Return the attributes to copy or pickle, which leave out the lock."""
+        state = self.__dict__.copy()
+        del state['_ponder_lock']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        """Set the attributes of a copy made from state, with a lock of its own."""
+        self.__dict__.update(state)
+        self._ponder_lock = threading.Lock()
 
     def make_move(self, initial: Board) -> list:
         """Make a move given the current game, using a MiniMax algorithim on the generated gametree
-        """
-        g = gen_gametree(self.depth, initial)
 
-        if g.get_subtrees() == []:
+        The game tree is kept between moves. Each move first follows the tree down through the
+        moves played since this player's last move, so only the new frontier has to be expanded,
+        then moves down into the chosen move, freeing the branches that were not played.
+
+        A timed search always finishes depth 1, then deepens until depth or the time limit and
+        plays the best move of the deepest search that finished. On a ponder hit the deepening
+        goes straight from depth 1 to the pondered depth, whose nodes are already in the tree or
+        the table, and carries on from there.
+
+        >>> player = MiniMaxPlayer(12, False, time_limit=0.5)
+        >>> move = player.make_move(Board())
+        >>> player.searched_depth > 1
+        True
+        """
+        pondered_depth = self.stop_pondering()
+        valid_moves = frozenset(Position.from_board(move).pack()
+                                for move in initial.get_valid_moves())
+        g = self._follow_game(initial)
+        if g is None:
+            g = GameTree(Board([row.copy() for row in initial.board], [], initial.is_red_move,
+                               initial.move_type))
+            pondered_depth = 0
+        else:
+            # initial is the opponent's L move and neutral move below the pondered node
+            pondered_depth = max(0, pondered_depth - 2)
+            if pondered_depth > 0:
+                self.ponder_hits += 1
+
+        self.table.new_search()
+        if self.time_limit is None:
+            g.search(self.depth, self.table, symmetry=self._symmetry)
+            best_subtree = _best_valid_subtree(g, valid_moves)
+            self.searched_depth = self.depth
+        else:
+            deadline = Deadline(self.time_limit, self.poll)
+            self.searched_depth = min(1, self.depth)
+            g.search(self.searched_depth, self.table, symmetry=self._symmetry)
+            best_subtree = _best_valid_subtree(g, valid_moves)
+            # the pondered depths are quick to search again, unless the table or a pruning has
+            # lost some of them, so the deadline applies to them too
+            depth = max(self.searched_depth + 1, min(pondered_depth, self.depth))
+            # a forced win or loss will not change with a deeper search
+            while depth <= self.depth and g.score == 0.0:
+                try:
+                    g.search(depth, self.table, deadline, self._symmetry)
+                except SearchTimeout:
+                    break
+                best_subtree = _best_valid_subtree(g, valid_moves)
+                self.searched_depth = depth
+                depth += 1
+
+        if best_subtree is None:
+            self._game_tree = None
             return initial.board
         else:
-            best_move = []
-            if initial.is_red_move:
-                best_score = -2.0
-                for subtree in g.get_subtrees():
-                    if subtree.score > best_score:
-                        best_score = subtree.score
-                        best_move = subtree.board.board
+            self._game_tree = best_subtree
+            if self.ponder:
+                # the pruning is left to the pondering thread, on the opponent's time
+                if initial.move_type == 'black':
+                    self._start_pondering(best_subtree)
+            elif self.max_nodes is not None:
+                best_subtree.prune(self.max_nodes)
+            return best_subtree.position.to_board()
+
+    def stop_pondering(self) -> int:
+        """Stop the pondering thread, if there is one, and return the depth to which every reply
+        of the opponent was pondered (0 if the player was not pondering).
+
+        It may be called from any thread. Once it returns, the pondering thread has finished.
+        """
+        with self._ponder_lock:
+            if self._ponder_thread is None:
+                return 0
+            self._ponder_deadline.cancel()
+            self._ponder_thread.join()
+            self._ponder_thread = self._ponder_deadline = None
+            return self._pondered_depth
+
+    def close(self) -> None:
+        """Stop pondering for good, even if a move is being made on another thread."""
+        with self._ponder_lock:
+            self._closed = True
+        self.stop_pondering()
+
+    def _start_pondering(self, tree: GameTree) -> None:
+        """Start pondering the opponent's replies from tree in a background thread, unless this
+        player has been closed."""
+        with self._ponder_lock:
+            if self._closed:
+                return
+            self._pondered_depth = 0
+            self._ponder_deadline = Deadline(math.inf)
+            self._ponder_thread = threading.Thread(target=self._ponder,
+                                                   args=(tree, self._ponder_deadline),
+                                                   daemon=True)
+            self._ponder_thread.start()
+
+    def _ponder(self, tree: GameTree, deadline: Deadline) -> None:
+        """Search tree, a state with the opponent to move, one ply deeper at a time until deadline
+        is cancelled, the tree would probably outgrow max_nodes, or depth + 2 is reached (which
+        answers this player's next search at depth from the results).
+
+        At every depth the opponent's replies are searched best first, by their scores from the
+        previous depth, so the most likely replies are pondered deepest when time runs out.
+        """
+        if self.max_nodes is not None:
+            tree.prune(self.max_nodes)
+        size = len(tree)
+        try:
+            for depth in range(1, self.depth + 3):
+                tree.expand()
+                replies = sorted(tree.get_subtrees(), key=lambda reply: reply.score,
+                                 reverse=tree.is_red_move)
+                for reply in replies:
+                    reply.search(depth - 1, self.table, deadline, self._symmetry)
+                self._pondered_depth = depth
+                new_size = len(tree)
+                if self.max_nodes is not None and new_size * new_size // size > self.max_nodes:
+                    # the branching so far says the next depth would outgrow the budget
+                    return
+                size = new_size
+        except SearchTimeout:
+            return
+
+    def _follow_game(self, initial: Board) -> Optional[GameTree]:
+        """Return the node of this player's game tree for the game state initial.
+
+        The node is found by following the opponent's L move and neutral move down from the node
+        of this player's last move. Return None if it is not in the tree.
+        """
+        target = initial.position
+        tree = self._game_tree
+        for _ in range(3):
+            if tree is None:
+                break
+            position = tree.position
+            if position == target and tree.is_red_move == initial.is_red_move \
+                    and tree.move_type == initial.move_type:
+                return tree
+            if tree.move_type == 'red':
+                move = Position(target.red, position.blue, position.neutral)
+            elif tree.move_type == 'blue':
+                move = Position(position.red, target.blue, position.neutral)
             else:
-                best_score = 2.0
-                for subtree in g.get_subtrees():
-                    if subtree.score < best_score:
-                        best_score = subtree.score
-                        best_move = subtree.board.board
-            return best_move
+                move = target
+            tree.expand()
+            tree = tree.find_subtree_by_move(move.to_board())
+
+        return None
 
 
-class _AlphaBetaPlayer(Player):
+def _best_valid_subtree(tree: GameTree, valid_moves: frozenset[int]) -> Optional[GameTree]:
+    """Return the first subtree of tree with the best score for the player to move whose position,
+    packed by Position.pack, is in valid_moves, or None if there is none."""
+    best_subtree = None
+    for subtree in tree.get_subtrees():
+        # the tree does not know the game's previous boards, so skip moves they rule out
+        if subtree.position.pack() not in valid_moves:
+            continue
+        if best_subtree is None or (tree.is_red_move and subtree.score > best_subtree.score) \
+                or (not tree.is_red_move and subtree.score < best_subtree.score):
+            best_subtree = subtree
+    return best_subtree
+
+
+class AlphaBetaPlayer(Player):
     """An L Game AI who employs an alpha-beta pruning strategy.
 
-    NOTE: We are not able to implement Alpha Beta Pruning due to the fact that the GameTree's score
-    value is already calculated through gen_gametree(). This would have been the part of the code
-    that the AB player would have optimized. The code for the AB player to decide it's move is
-    present here, as this would be identical to how the MiniMax player would decide."""
+    Instead of building a GameTree, it runs a depth-first AlphaBetaSearch. At the same depth it
+    makes the same move as MiniMaxPlayer, while visiting only a fraction of the positions. The
+    search keeps its transposition table and move ordering scores for the whole game. With a time
+    limit, it deepens one ply at a time like MiniMaxPlayer.
+
+    Instance Attributes:
+        - depth: the depth searched, or the greatest depth searched if there is a time limit
+        - is_red_player: whether this player plays red
+        - engine: the search, kept for the whole game
+        - time_limit: the seconds allowed for each move, or None to always search to depth
+        - poll: a function called regularly during a timed search, or None
+        - searched_depth: the depth of the search that chose the latest move
+    """
     depth: int
     is_red_player: bool
-
-    def __init__(self, depth: int, is_red_player: bool) -> None:
+    engine: AlphaBetaSearch
+    time_limit: Optional[float]
+    poll: Optional[Callable[[], object]]
+    searched_depth: int
+
+    def __init__(self, depth: int, is_red_player: bool, table_size: int = 1 << 16,
+                 time_limit: Optional[float] = None,
+                 poll: Optional[Callable[[], object]] = None, symmetric: bool = False) -> None:
         """Initialize this player.
 
+        time_limit and poll are used as in MiniMaxPlayer. If symmetric is True, the search keys
+        its transposition table by canonical state (see AlphaBetaSearch).
+
         Preconditions:
-            - game_tree represents a game tree at the initial state
-            - depth >= 0
+            - depth >= 1
+            - table_size > 0
+            - time_limit is None or time_limit >= 0
         """
         self.is_red_player = is_red_player
         self.depth = depth
+        self.engine = AlphaBetaSearch(table_size, symmetric)
+        self.time_limit = time_limit
+        self.poll = poll
+        self.searched_depth = 0
 
     def make_move(self, initial: Board) -> list:
         """Make a move given the current game.
 
-        previous_move is the opponent player's most recent move, or None if no moves
-        have been made.
+        The number of positions the latest search visited is left in self.engine.nodes.
+        """
+        valid_moves = initial.get_valid_moves()
+        if valid_moves == []:
+            return initial.board
+        moves = [Position.from_board(move) for move in valid_moves]
+        state = (initial.position, initial.is_red_move, initial.move_type)
+        if self.time_limit is None:
+            _, best_move = self.engine.search(*state, self.depth, moves)
+            self.searched_depth = self.depth
+        else:
+            deadline = Deadline(self.time_limit, self.poll)
+            score, best_move = self.engine.search(*state, 1, moves)
+            self.searched_depth = 1
+            # a forced win or loss will not change with a deeper search
+            while self.searched_depth < self.depth and score == 0.0:
+                try:
+                    score, best_move = self.engine.search(*state, self.searched_depth + 1, moves,
+                                                          deadline)
+                except SearchTimeout:
+                    break
+                self.searched_depth += 1
+        return valid_moves[moves.index(best_move)]
+
+
+class MCTSPlayer(Player):
+    """An L Game AI who employs Monte Carlo tree search, using the UCT rule to pick which moves to
+    explore and random playouts to score them.
+
+    The search tree is kept between moves. After each move the player makes the node for the
+    current game state the root, so the playouts already run below it are kept.
+
+    Instance Attributes:
+        - is_red_player: whether this player is red
+        - iterations: the most playouts to run per move, or None for no limit
+        - time_limit: the most seconds to search per move, or None for no limit
+        - tree: the search tree, or None before the first move
+        - playouts_per_second: the playout rate of the latest move
+
+    Representation Invariants:
+        - self.iterations is not None or self.time_limit is not None
+    """
+    is_red_player: bool
+    iterations: Optional[int]
+    time_limit: Optional[float]
+    tree: Optional[MCTSTree]
+    playouts_per_second: float
+
+    # Private Instance Attributes:
+    #  - _capacity: the most nodes the search tree may hold
+    #  - _seed: the seed for the random playouts
+    _capacity: int
+    _seed: Optional[int]
+
+    def __init__(self, is_red_player: bool, iterations: Optional[int] = 1000,
+                 time_limit: Optional[float] = None, capacity: int = 1 << 18,
+                 seed: Optional[int] = None) -> None:
+        """Initialize this player.
 
         Preconditions:
-            - There is at least one valid move for the given game
+            - iterations is not None or time_limit is not None
+            - iterations is None or iterations > 0
+            - capacity > 0
         """
-        g = gen_gametree(self.depth, initial)
+        self.is_red_player = is_red_player
+        self.iterations = iterations
+        self.time_limit = time_limit
+        self.tree = None
+        self.playouts_per_second = 0.0
+        self._capacity = capacity
+        self._seed = seed
 
-        if g.get_subtrees() == []:
+    def make_move(self, initial: Board) -> list:
+        """Make a move given the current game by running Monte Carlo tree search from it and
+        choosing the most visited valid move."""
+        valid_moves = initial.get_valid_moves()
+        if valid_moves == []:
             return initial.board
+        moves = [Position.from_board(move) for move in valid_moves]
+
+        state = (initial.position, initial.is_red_move, initial.move_type)
+        if self.tree is None:
+            # without a seed of its own, seed the tree from the random module so that seeding
+            # the random module makes the whole game reproducible
+            seed = self._seed if self._seed is not None else random.getrandbits(64)
+            self.tree = MCTSTree(*state, capacity=self._capacity, seed=seed)
         else:
-            best_move = []
-            if initial.is_red_move:
-                best_score = -2.0
-                for subtree in g.get_subtrees():
-                    if subtree.score > best_score:
-                        best_score = subtree.score
-                        best_move = subtree.board.board
+            self.tree.advance(*state)
+        self.tree.run(self.iterations, self.time_limit)
+        self.playouts_per_second = self.tree.playouts_per_second
+
+        best_move = self.tree.best_move(moves)
+        self.tree.advance(best_move, *next_turn(initial.is_red_move, initial.move_type))
+        return valid_moves[moves.index(best_move)]
+
+
+class TablebasePlayer(Player):
+    """An L Game AI who plays perfectly by looking every move up in the solved tablebase.
+
+    It wins whenever it can (as quickly as possible), draws otherwise, and when it is lost it makes
+    the game last as long as possible.
+    """
+    is_red_player: bool
+    tablebase: Tablebase
+
+    def __init__(self, is_red_player: bool, path: str = TABLEBASE_FILE) -> None:
+        """Initialize this player, mapping the tablebase stored at path.
+
+        The tablebase is built and saved to path first if it does not exist yet. Every player and
+        process using the same file shares one copy of it, which copies of this player share too.
+        """
+        self.is_red_player = is_red_player
+        self.tablebase = Tablebase(path)
+
+    def make_move(self, initial: Board) -> list:
+        """Make a move given the current game by choosing the valid move with the best tablebase
+        result for the player to move."""
+        valid_moves = initial.get_valid_moves()
+        if valid_moves == []:
+            return initial.board
+
+        best_move = valid_moves[0]
+        best_rank = None
+        for move in valid_moves:
+            if initial.move_type != 'black':
+                # the same player then moves a neutral piece, so their result carries over
+                result, dtm = self.tablebase.lookup(Position.from_board(move), initial.is_red_move,
+                                                    'black')
+            else:
+                result, dtm = self.tablebase.lookup(Position.from_board(move),
+                                                    not initial.is_red_move,
+                                                    'blue' if initial.is_red_move else 'red')
+                result = {WIN: LOSS, LOSS: WIN}.get(result, result)
+
+            if result == WIN:
+                rank = (2, -dtm)
+            elif result == LOSS:
+                rank = (0, dtm)
             else:
-                best_score = 2.0
-                for subtree in g.get_subtrees():
-                    if subtree.score < best_score:
-                        best_score = subtree.score
-                        best_move = subtree.board.board
-            return best_move
+                rank = (1, 0)
+            if best_rank is None or rank > best_rank:
+                best_rank = rank
+                best_move = move
+        return best_move
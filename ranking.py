@@ -0,0 +1,96 @@
+"""
+CSC111 2021 Final Project - The L Game
+
+This file stores the dense ranking of L Game positions: every legal position (two L pieces that do
+not overlap, and two neutral pieces on the other squares) and every game state (a position with
+the player and the kind of piece to move) is numbered from 0 with no gaps, so a table over all of
+them can be a fixed-size array indexed by rank instead of a dict.
+
+There are 656 ways to place the two L pieces and 28 ways to place the neutral pieces around them,
+so 18368 positions, whose ranks fit in 2 bytes, and 4 times as many states. Ranking and unranking
+are single table lookups.
+
+This file is Copyright (c) 2021 Siddarth Dagar, Daniel Zhu, and Bradley Mathi.
+"""
+from __future__ import annotations
+from itertools import combinations
+from bitboard import Position, FULL_MASK, L_PLACEMENTS, squares
+
+
+def _build_positions() -> tuple[Position, ...]:
+    """Return every legal position, ordered by red L, then blue L (both in the order of
+    L_PLACEMENTS), then neutral pieces (in the order of their squares)."""
+    positions = []
+    for red in L_PLACEMENTS:
+        for blue in L_PLACEMENTS:
+            if red & blue:
+                continue
+            for first, second in combinations(squares(FULL_MASK & ~(red | blue)), 2):
+                positions.append(Position(red, blue, 1 << first | 1 << second))
+    return tuple(positions)
+
+
+_POSITIONS = _build_positions()
+_RANKS = dict(zip(_POSITIONS, range(len(_POSITIONS))))
+_MOVE_TYPES = ('red', 'blue', 'black')
+
+# The number of legal positions, and of game states
+POSITIONS = len(_POSITIONS)
+STATES = POSITIONS * 4
+
+
+def rank(position: Position) -> int:
+    """Return the rank of position, from 0 to POSITIONS - 1.
+
+    Raise ValueError if position is not a legal position.
+
+    >>> from constants import STARTING_BOARD
+    >>> start = Position.from_board(STARTING_BOARD)
+    >>> unrank(rank(start)) == start
+    True
+    >>> sorted(rank(position) for position in map(unrank, range(POSITIONS))) == \\
+    ...     list(range(POSITIONS))
+    True
+    """
+    try:
+        return _RANKS[position]
+    except KeyError:
+        raise ValueError(f'{position} is not a legal position') from None
+
+
+def unrank(position_rank: int) -> Position:
+    """Return the position whose rank is position_rank.
+
+    Preconditions:
+        - 0 <= position_rank < POSITIONS
+    """
+    return _POSITIONS[position_rank]
+
+
+def state_rank(position: Position, is_red_move: bool, move_type: str) -> int:
+    """Return the rank of the game state (position, is_red_move, move_type), from 0 to
+    STATES - 1: 4 times the rank of position, plus 2 if red is to move, plus 1 if a neutral
+    piece is to move.
+
+    Preconditions:
+        - move_type in {'red', 'blue', 'black'}
+        - move_type == 'black' or is_red_move == (move_type == 'red')
+
+    >>> from constants import STARTING_BOARD
+    >>> start = Position.from_board(STARTING_BOARD)
+    >>> unrank_state(state_rank(start, False, 'black')) == (start, False, 'black')
+    True
+    """
+    return rank(position) * 4 + is_red_move * 2 + (move_type == 'black')
+
+
+def unrank_state(rank_of_state: int) -> tuple[Position, bool, str]:
+    """Return the game state (position, is_red_move, move_type) whose rank is rank_of_state.
+
+    Preconditions:
+        - 0 <= rank_of_state < STATES
+    """
+    position_rank, turn = divmod(rank_of_state, 4)
+    is_red_move = turn >= 2
+    move_type = 'black' if turn & 1 else _MOVE_TYPES[not is_red_move]
+    return _POSITIONS[position_rank], is_red_move, move_type
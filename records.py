@@ -0,0 +1,174 @@
+"""
+CSC111 2021 Final Project - The L Game
+
+This file stores the game record format: a compact binary file of whole games, with a streaming
+reader and writer, and the converter from the CSV format of sample_game.csv.
+
+A game is the list of its positions, one after every turn (an L move and the neutral move after
+it), starting with the position before the first turn, and with red moving first. That is the
+order of the boards in sample_game.csv. The L move of each turn is not stored separately, since
+it is the new position's L of the player who moved, with the other pieces where they were before.
+
+The file starts with a 5 byte header, b'LGGR' and the format version. Each game follows as a 2
+byte count of its positions, then each position as its 2 byte code, its rank among all legal
+positions (see ranking.rank). Every integer is little-endian. A game of 20 turns takes 44 bytes,
+so a million such games take 44 MB.
+
+Run it from the command line to convert a CSV file:
+
+    python records.py sample_game.csv sample_game.lgr
+
+This file is Copyright (c) 2021 Siddarth Dagar, Daniel Zhu, and Bradley Mathi.
+"""
+from __future__ import annotations
+import csv
+import sys
+from array import array
+from typing import Iterable, Iterator, Union
+from bitboard import Position
+from ranking import POSITIONS, rank, unrank
+
+_MAGIC = b'LGGR'
+_VERSION = 2
+_HEADER = _MAGIC + bytes([_VERSION])
+_CODE_BYTES = 2
+_COUNT_BYTES = 2
+MAX_GAME_LENGTH = (1 << 8 * _COUNT_BYTES) - 1
+
+# The position of every code, and the bytes of the positions encoded so far; a file of many games
+# holds the same positions over and over, so each is only converted once
+_positions = tuple(unrank(code) for code in range(POSITIONS))
+_encoded: dict[Position, bytes] = {}
+
+
+def position_code(position: Position) -> int:
+    """Return the code of position in a game record file, which is its rank (see ranking.rank).
+
+    Every code is below POSITIONS, so it fits in 2 bytes.
+
+    >>> from constants import STARTING_BOARD
+    >>> start = Position.from_board(STARTING_BOARD)
+    >>> position_from_code(position_code(start)) == start
+    True
+    """
+    return rank(position)
+
+
+def position_from_code(code: int) -> Position:
+    """Return the position whose code, as returned by position_code, is code.
+
+    Raise ValueError if code is not the code of a position.
+    """
+    if not 0 <= code < POSITIONS:
+        raise ValueError(f'{code} is not a position code')
+    return unrank(code)
+
+
+def write_games(path: str, games: Iterable[Iterable[Union[Position, list]]],
+                append: bool = False) -> int:
+    """Write games to the game record file at path, and return the number of games written.
+
+    Each game is an iterable of its positions, given as Positions or as boards. games is consumed
+    one game at a time, so it may be a generator of more games than fit in memory. If append is
+    True, the games are added to the end of the file, which is made if it does not exist.
+
+    Preconditions:
+        - every game has at most MAX_GAME_LENGTH positions
+
+    >>> import os, tempfile
+    >>> from constants import STARTING_BOARD
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     path = os.path.join(directory, 'games.lgr')
+    ...     first = write_games(path, [[STARTING_BOARD], []])
+    ...     second = write_games(path, [[STARTING_BOARD] * 3], append=True)
+    ...     lengths = [len(game) for game in read_games(path)]
+    ...     size = os.path.getsize(path)
+    >>> first, second, lengths, size
+    (2, 1, [1, 0, 3], 19)
+    """
+    written = 0
+    with open(path, 'ab' if append else 'wb') as file:
+        if file.tell() == 0:
+            file.write(_HEADER)
+        for game in games:
+            codes = bytearray()
+            for position in game:
+                if not isinstance(position, Position):
+                    position = Position.from_board(position)
+                encoded = _encoded.get(position)
+                if encoded is None:
+                    encoded = _encoded[position] = \
+                        position_code(position).to_bytes(_CODE_BYTES, 'little')
+                codes += encoded
+            length = len(codes) // _CODE_BYTES
+            if length > MAX_GAME_LENGTH:
+                raise ValueError(f'a game of {length} positions is too long to record')
+            file.write(length.to_bytes(_COUNT_BYTES, 'little'))
+            file.write(codes)
+            written += 1
+    return written
+
+
+def read_games(path: str, decode: bool = True) -> Iterator[list]:
+    """Yield the positions of each game in the game record file at path, in the order they were
+    written, as a list of Positions, or as an array of their codes (see position_code) if decode
+    is False.
+
+    The games are read one at a time, so the file may hold more games than fit in memory. Raise
+    ValueError if path is not a game record file or ends partway through a game.
+    """
+    with open(path, 'rb') as file:
+        if file.read(len(_HEADER)) != _HEADER:
+            raise ValueError(f'{path} is not a version {_VERSION} game record file')
+        while True:
+            count = file.read(_COUNT_BYTES)
+            if count == b'':
+                return
+            length = int.from_bytes(count, 'little')
+            data = file.read(length * _CODE_BYTES)
+            if len(count) < _COUNT_BYTES or len(data) < length * _CODE_BYTES:
+                raise ValueError(f'{path} ends partway through a game')
+            codes = array('H', data)
+            if sys.byteorder == 'big':
+                codes.byteswap()
+            if not decode:
+                yield codes
+            elif max(codes, default=0) < POSITIONS:
+                yield [_positions[code] for code in codes]
+            else:
+                raise ValueError(f'{path} holds a code that is not a position code')
+
+
+def read_csv_games(path: str) -> Iterator[list[Position]]:
+    """Yield the positions of each game in the CSV file at path, in the format of
+    sample_game.csv.
+
+    Each row of the file is one game, and every 4 cells of a row are the rows of one board, with
+    the colours of a row separated by commas. Spaces around the colours and empty cells are
+    ignored.
+
+    >>> from constants import STARTING_BOARD
+    >>> game = next(read_csv_games('sample_game.csv'))
+    >>> game[0] == Position.from_board(STARTING_BOARD), len(game)
+    (True, 5)
+    """
+    with open(path, newline='') as csv_file:
+        for row in csv.reader(csv_file):
+            cells = [cell for cell in row if cell.strip() != '']
+            yield [Position.from_board([[colour.strip() for colour in cell.split(',')]
+                                        for cell in cells[i:i + 4]])
+                   for i in range(0, len(cells) - 3, 4)]
+
+
+def convert_csv(csv_path: str, records_path: str) -> int:
+    """Write the games of the CSV file at csv_path to a new game record file at records_path,
+    and return the number of games converted."""
+    return write_games(records_path, read_csv_games(csv_path))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print('usage: python records.py GAMES.csv GAMES.lgr')
+        sys.exit(2)
+    converted = convert_csv(sys.argv[1], sys.argv[2])
+    print(f'Converted {converted} games from {sys.argv[1]} to {sys.argv[2]}')
@@ -0,0 +1,106 @@
+"""
+CSC111 2021 Final Project - The L Game
+
+This file stores the BoardRenderer class, which draws boards in the pygame window.
+
+The picture of every kind of cell (empty, red, blue and neutral, each with its grid lines) is drawn
+once when the renderer is made. Drawing a board then only copies the pictures of the cells that
+changed since the last board drawn, and only those cells are sent to the display, so the cost of a
+move does not depend on the size of the window.
+
+Nothing here needs a real display: with the SDL_VIDEODRIVER environment variable set to 'dummy',
+or when drawing onto an ordinary pygame.Surface, the renderer works the same way.
+
+This file is Copyright (c) 2021 Siddarth Dagar, Daniel Zhu, and Bradley Mathi.
+"""
+from __future__ import annotations
+from typing import Optional
+import pygame
+from constants import ROWS, COLS, SQUARE_SIZE, LINE_THICC
+
+PIECE_COLOURS = ('white', 'red', 'blue', 'black')
+
+
+class BoardRenderer:
+    """Draws boards onto a surface, redrawing only the cells that changed.
+
+    Instance Attributes:
+        - surface: the surface drawn on, usually the display surface
+        - square_size: the width and height of a cell, in pixels
+
+    Representation Invariants:
+        - self.square_size > 2 * LINE_THICC
+
+    >>> renderer = BoardRenderer(pygame.Surface((4 * SQUARE_SIZE, 4 * SQUARE_SIZE)))
+    >>> from constants import STARTING_BOARD
+    >>> len(renderer.draw(STARTING_BOARD))
+    16
+    >>> board = [row.copy() for row in STARTING_BOARD]
+    >>> board[0][0], board[0][3] = 'white', 'black'
+    >>> sorted(tuple(rect) for rect in renderer.draw(board))
+    [(0, 0, 200, 200), (600, 0, 200, 200)]
+    """
+    surface: pygame.Surface
+    square_size: int
+
+    # Private Instance Attributes:
+    #  - _cells: the picture of a cell holding each piece colour
+    #  - _shown: the colours of the cells as they are on the surface, or None if the surface has
+    #      to be redrawn entirely
+    _cells: dict[str, pygame.Surface]
+    _shown: Optional[list[list[str]]]
+
+    def __init__(self, surface: pygame.Surface, square_size: int = SQUARE_SIZE) -> None:
+        """Initialize a renderer drawing on surface, with cells square_size pixels wide."""
+        self.surface = surface
+        self.square_size = square_size
+        self._cells = {colour: _cell_picture(colour, square_size) for colour in PIECE_COLOURS}
+        if pygame.display.get_surface() is not None:
+            # match the display's pixel format, which makes copying the pictures much faster
+            self._cells = {colour: cell.convert() for colour, cell in self._cells.items()}
+        self._shown = None
+
+    def invalidate(self) -> None:
+        """Make the next draw redraw every cell, for when the surface was drawn over."""
+        self._shown = None
+
+    def draw(self, board: list) -> list[pygame.Rect]:
+        """Draw board onto the surface and return the rectangles of the cells that changed.
+
+        Preconditions:
+            - all(colour in PIECE_COLOURS for row in board for colour in row)
+        """
+        dirty = []
+        size = self.square_size
+        for row in range(ROWS):
+            for col in range(COLS):
+                colour = board[row][col]
+                if self._shown is None or self._shown[row][col] != colour:
+                    dirty.append(self.surface.blit(self._cells[colour], (col * size, row * size)))
+        self._shown = [list(row) for row in board]
+        return dirty
+
+    def present(self, board: list) -> list[pygame.Rect]:
+        """Draw board, send the cells that changed to the display and return their rectangles.
+
+        The display is only updated if the surface is the display surface.
+        """
+        dirty = self.draw(board)
+        if dirty and self.surface is pygame.display.get_surface():
+            pygame.display.update(dirty)
+        return dirty
+
+
+def _cell_picture(colour: str, size: int) -> pygame.Surface:
+    """Return the picture of a cell of the given size holding a piece of colour, drawn the way
+    Board.draw_board and Board.draw_pieces draw it."""
+    cell = pygame.Surface((size, size))
+    cell.fill(pygame.color.Color('white'))
+    pygame.draw.rect(cell, pygame.color.Color('black'), (0, 0, size, size), LINE_THICC)
+    if colour == 'black':
+        pygame.draw.circle(cell, pygame.color.Color('black'), (size / 2, size / 2),
+                           size // 2 - LINE_THICC)
+    else:
+        pygame.draw.rect(cell, pygame.color.Color(colour),
+                         (LINE_THICC, LINE_THICC, size - 2 * LINE_THICC, size - 2 * LINE_THICC), 0)
+    return cell
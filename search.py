@@ -0,0 +1,244 @@
+"""
+CSC111 2021 Final Project - The L Game
+
+This file stores the AlphaBetaSearch class, a depth-first negamax search with alpha-beta pruning
+that works directly on bitboard positions instead of building a GameTree.
+
+Scores are the same as GameTree.score (1.0 for a forced win, -1.0 for a forced loss and 0.0
+otherwise) but are given from the point of view of the player to move. The player to move only
+changes after a neutral move, so a score is negated when passing from a neutral move to the next
+L move, and carried over unchanged from an L move to the same player's neutral move.
+
+A score from the point of view of the player to move is the same in every state symmetric to the
+state (see symmetry.py), so a symmetric search keys its transposition table by canonical state: a
+position searched once is not searched again in any of its up to 16 symmetric forms.
+
+This file is Copyright (c) 2021 Siddarth Dagar, Daniel Zhu, and Bradley Mathi.
+"""
+from __future__ import annotations
+from typing import Optional, Sequence
+from bitboard import Position, MOVE_CACHE, next_turn
+from transposition import TranspositionTable, zobrist_hash, zobrist_update, EXACT, LOWER, UPPER
+from symmetry import SymmetryTable, transform_position, untransform_move
+from deadline import Deadline
+
+# Below and above every real score
+_INFINITY = 2
+
+
+def _move_id(move: Position, move_type: str) -> int:
+    """Return the squares the moved piece(s) land on, which identify a move for the killer and
+    history heuristics independently of where the other pieces are."""
+    if move_type == 'red':
+        return move.red
+    elif move_type == 'blue':
+        return move.blue
+    return move.neutral
+
+
+class AlphaBetaSearch:
+    """A negamax search with alpha-beta pruning and principal variation search.
+
+    Moves are tried in the order: the best move stored in the transposition table, then the killer
+    moves that caused a cutoff at the same ply, then the rest by their history score. The table
+    and the history scores are kept between searches, so a player can reuse them all game.
+
+    Instance Attributes:
+        - table: the transposition table of positions already searched
+        - nodes: the number of positions visited by the latest search
+        - total_nodes: the number of positions visited by every search so far
+
+    Representation Invariants:
+        - self.nodes >= 0
+        - self.total_nodes >= self.nodes
+    """
+    table: TranspositionTable
+    nodes: int
+    total_nodes: int
+
+    # Private Instance Attributes:
+    #  - _killers: the (at most 2) moves that most recently caused a cutoff at each ply
+    #  - _history: how much each (move_type, move id) has caused cutoffs, weighted by depth
+    #  - _deadline: the deadline of the search in progress, or None
+    #  - _symmetry: the canonical states the table is keyed by, or None to key it by Zobrist hash
+    _killers: dict[int, list[int]]
+    _history: dict[tuple[str, int], int]
+    _deadline: Optional[Deadline]
+    _symmetry: Optional[SymmetryTable]
+
+    def __init__(self, table_size: int = 1 << 16, symmetric: bool = False) -> None:
+        """Initialize a search with an empty transposition table of table_size entries.
+
+        If symmetric is True, the table is keyed by canonical state, so symmetric states share
+        their entries. The SymmetryTable this needs is built and saved the first time.
+
+        Preconditions:
+            - table_size > 0
+        """
+        self.table = TranspositionTable(table_size)
+        self.nodes = self.total_nodes = 0
+        self._killers = {}
+        self._history = {}
+        self._deadline = None
+        self._symmetry = SymmetryTable() if symmetric else None
+
+    def search(self, position: Position, is_red_move: bool, move_type: str, depth: int,
+               moves: Optional[Sequence[Position]] = None,
+               deadline: Optional[Deadline] = None) -> tuple[float, Optional[Position]]:
+        """Return (score, best move) of searching the given state depth moves deep.
+
+        moves are the root moves to choose from, in the order to try them; they default to every
+        valid move. The best move is the first of moves with the best score, which is the move
+        MiniMaxPlayer would choose at the same depth. It is None if there are no moves.
+
+        If deadline is given, it is checked at every position, so the search raises SearchTimeout
+        once it passes. Only complete results are stored in the transposition table, so the
+        table can still be used by the next search.
+
+        Preconditions:
+            - depth >= 1
+            - move_type in {'red', 'blue', 'black'}
+
+        >>> from constants import STARTING_BOARD
+        >>> engine = AlphaBetaSearch()
+        >>> engine.search(Position.from_board(STARTING_BOARD), True, 'red', 3)[0]
+        0.0
+        """
+        self.table.new_search()
+        self._killers = {}
+        self._deadline = deadline
+        self.nodes = 1
+        if moves is None:
+            moves = MOVE_CACHE.moves(position, move_type)
+        if not moves:
+            self.total_nodes += self.nodes
+            return -1.0, None
+
+        key = zobrist_hash(position, is_red_move, move_type)
+        child_red, child_type = next_turn(is_red_move, move_type)
+        same_player = move_type != 'black'
+        alpha, beta = -_INFINITY, _INFINITY
+        best_move = None
+        for move in moves:
+            child_key = zobrist_update(key, position, move, move_type)
+            if best_move is None:
+                score = self._child_score(move, child_red, child_type, depth - 1, alpha, beta,
+                                          1, child_key, same_player)
+            else:
+                score = self._child_score(move, child_red, child_type, depth - 1, alpha,
+                                          alpha + 1, 1, child_key, same_player)
+                if alpha < score < beta:
+                    score = self._child_score(move, child_red, child_type, depth - 1, alpha,
+                                              beta, 1, child_key, same_player)
+            if score > alpha:
+                alpha = score
+                best_move = move
+            if alpha >= 1:
+                # nothing beats a forced win
+                break
+        self.total_nodes += self.nodes
+        return float(alpha), best_move
+
+    def _child_score(self, child: Position, is_red_move: bool, move_type: str, depth: int,
+                     alpha: float, beta: float, ply: int, key: int, same_player: bool) -> float:
+        """Return the score of child from the point of view of the player who moved into it,
+        searched within the window (alpha, beta) of that player."""
+        if same_player:
+            return self._negamax(child, is_red_move, move_type, depth, alpha, beta, ply, key)
+        return -self._negamax(child, is_red_move, move_type, depth, -beta, -alpha, ply, key)
+
+    def _negamax(self, position: Position, is_red_move: bool, move_type: str, depth: int,
+                 alpha: float, beta: float, ply: int, key: int) -> float:
+        """Return the score of the state for the player to move, searched depth moves deep.
+
+        The score is exact if it lies strictly inside (alpha, beta). Otherwise it is a bound: at
+        most alpha if every move failed low, and at least beta if a move caused a cutoff.
+        """
+        self.nodes += 1
+        if self._deadline is not None:
+            self._deadline.check()
+        moves = MOVE_CACHE.moves(position, move_type)
+        if not moves:
+            return -1
+        if depth == 0:
+            return 0
+
+        # the moves stored under a canonical key are in the canonical orientation
+        transform = 0
+        if self._symmetry is not None:
+            key, transform = self._symmetry.canonical(position, is_red_move, move_type)
+        entry = self.table.probe(key, depth)
+        if entry is not None:
+            if entry.bound == EXACT:
+                return entry.score
+            elif entry.bound == LOWER:
+                alpha = max(alpha, entry.score)
+            else:
+                beta = min(beta, entry.score)
+            if alpha >= beta:
+                return entry.score
+        else:
+            entry = self.table.get(key)
+        best_stored = None if entry is None else entry.best_move
+        if transform and best_stored is not None:
+            best_stored = untransform_move(best_stored, transform)
+
+        original_alpha = alpha
+        child_red, child_type = next_turn(is_red_move, move_type)
+        same_player = move_type != 'black'
+        best_score, best_move = -_INFINITY, None
+        for move in self._order(moves, move_type, ply, best_stored):
+            # a symmetric search finds each child's key from its state instead
+            child_key = 0 if self._symmetry is not None else \
+                zobrist_update(key, position, move, move_type)
+            if best_move is None:
+                score = self._child_score(move, child_red, child_type, depth - 1, alpha, beta,
+                                          ply + 1, child_key, same_player)
+            else:
+                score = self._child_score(move, child_red, child_type, depth - 1, alpha,
+                                          alpha + 1, ply + 1, child_key, same_player)
+                if alpha < score < beta:
+                    score = self._child_score(move, child_red, child_type, depth - 1, score,
+                                              beta, ply + 1, child_key, same_player)
+            if score > best_score:
+                best_score, best_move = score, move
+                alpha = max(alpha, score)
+            if alpha >= beta:
+                self._record_cutoff(move, move_type, ply, depth)
+                break
+
+        if best_score <= original_alpha:
+            bound = UPPER
+        elif best_score >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        if transform and best_move is not None:
+            self.table.store(key, depth, best_score, transform_position(best_move, transform),
+                             bound)
+        else:
+            self.table.store(key, depth, best_score, best_move, bound)
+        return best_score
+
+    def _order(self, moves: Sequence[Position], move_type: str, ply: int,
+               best_stored: Optional[Position]) -> list[Position]:
+        """Return moves in the order to search them."""
+        killers = self._killers.get(ply, [])
+
+        def priority(move: Position) -> tuple[int, int, int]:
+            """Return a sort key that puts the most promising moves first."""
+            move_id = _move_id(move, move_type)
+            return (move != best_stored, move_id not in killers,
+                    -self._history.get((move_type, move_id), 0))
+
+        return sorted(moves, key=priority)
+
+    def _record_cutoff(self, move: Position, move_type: str, ply: int, depth: int) -> None:
+        """Update the killer moves and history scores after move caused a cutoff."""
+        move_id = _move_id(move, move_type)
+        killers = self._killers.setdefault(ply, [])
+        if move_id not in killers:
+            killers.insert(0, move_id)
+            del killers[2:]
+        self._history[(move_type, move_id)] = \
+            self._history.get((move_type, move_id), 0) + depth * depth
@@ -0,0 +1,469 @@
+"""
+CSC111 2021 Final Project - The L Game
+
+This file stores the GameServer class, an asyncio server that hosts many L Games at once over a
+local TCP or Unix socket, with the AI's moves chosen by one shared search engine.
+
+A client sends one JSON object per line, and gets one JSON object per line back. Boards are in the
+usual format, a list of 4 rows of 4 colours. The requests are:
+
+    {"op": "new", "ai": "blue", "depth": 6, "time_limit": 0.5}
+        Start a game against an AI playing "ai" ('red' or 'blue', 'blue' by default), searching
+        at most depth plies for at most time_limit seconds a move (the server's defaults if
+        left out, and no more than its maximums). The reply holds the session id, the depth and
+        time limit used, and if the AI plays red, its first turn.
+    {"op": "move", "session": 1, "l_move": BOARD, "neutral_move": BOARD}
+        Play the human's turn, the board after their L move and the board after their neutral
+        move (neutral_move may be left out or null to skip the neutral move). The reply holds the
+        AI's L move and neutral move, the board after them, and the winner once there is one.
+    {"op": "end", "session": 1}
+        End a game. Games also end when their connection closes.
+    {"op": "stats"}
+        Reply with the server's metrics (see GameServer.metrics).
+
+A request that cannot be carried out gets the reply {"error": REASON}.
+
+The searches run in a pool of worker processes, so they run in parallel and do not hold up the
+server. Each worker keeps one AlphaBetaSearch, with its transposition table keyed by canonical
+state, and one MoveCache for all the games, so a position searched for one game (or a symmetric
+one) is not searched again for another. The moves
+that are not cached are read from the move table (see tables.py), which every worker maps from one
+file. With no worker processes, every search runs on one background thread of the server process
+instead, and all the games share a single engine.
+
+Run it from the command line:
+
+    python server.py --port 8111 --workers 4
+    python server.py --unix /tmp/lgame.sock
+
+This file is Copyright (c) 2021 Siddarth Dagar, Daniel Zhu, and Bradley Mathi.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Optional
+from constants import STARTING_BOARD
+from board import Board
+from bitboard import MOVE_CACHE
+from history import PositionHistory
+from player import AlphaBetaPlayer
+from tables import share_moves
+
+DEFAULT_PORT = 8111
+DEFAULT_DEPTH = 8
+DEFAULT_TIME_LIMIT = 0.5
+# The greatest depth and time limit a client may ask for, so no game holds a worker for long
+MAX_DEPTH = 20
+MAX_TIME_LIMIT = 5.0
+# The number of latest requests the latency percentiles are taken over
+LATENCY_WINDOW = 1000
+
+
+class RequestError(Exception):
+    """Raised when a client's request cannot be carried out, with the reason sent back to it."""
+
+
+class GameSession:
+    """One game hosted by the server, between a client and the AI.
+
+    Instance Attributes:
+        - id: the number that requests refer to the game by
+        - board: the game so far
+        - ai_colour: the colour the AI plays, 'red' or 'blue'
+        - depth: the most plies the AI searches
+        - time_limit: the most seconds the AI searches for each move
+        - winner: 'red' or 'blue' once the game is over, and None before
+
+    Representation Invariants:
+        - self.ai_colour in {'red', 'blue'}
+        - self.depth >= 1
+    """
+    id: int
+    board: Board
+    ai_colour: str
+    depth: int
+    time_limit: float
+    winner: Optional[str]
+
+    def __init__(self, session_id: int, ai_colour: str, depth: int, time_limit: float) -> None:
+        """Initialize a game at the starting board, with red to move."""
+        self.id = session_id
+        self.board = Board([row.copy() for row in STARTING_BOARD])
+        self.ai_colour = ai_colour
+        self.depth = depth
+        self.time_limit = time_limit
+        self.winner = None
+
+    def play(self, move: Any) -> None:
+        """Play move, the board after the next move of the game, raising RequestError if it is not
+        a valid move."""
+        if move not in self.board.get_valid_moves():
+            raise RequestError(f'not a valid {self.board.move_type} move: {move}')
+        self.board.previous_boards.append(self.board.board)
+        self.board.board = move
+        if self.board.move_type == 'black':
+            self.end_turn()
+        else:
+            self.board.move_type = 'black'
+
+    def play_turn(self, l_move: Any, neutral_move: Any) -> None:
+        """Play a whole turn, the board after the L move and the board after the neutral move
+        (None, or the same board again, to skip it), raising RequestError if either is not a valid
+        move. The game is left as it was unless the whole turn is valid.
+
+        >>> session = GameSession(1, 'blue', 1, 0.0)
+        >>> l_move = session.board.get_valid_moves()[0]
+        >>> session.play_turn(l_move, STARTING_BOARD)  # doctest: +ELLIPSIS
+        Traceback (most recent call last):
+        ...
+        server.RequestError: not a valid black move: ...
+        >>> session.board.board == STARTING_BOARD, session.board.move_type
+        (True, 'red')
+        """
+        board = self.board
+        before = (board.board, board.previous_boards.copy(), board.is_red_move, board.move_type,
+                  self.winner)
+        try:
+            self.play(l_move)
+            if neutral_move is None or neutral_move == board.board:
+                self.end_turn()
+            else:
+                self.play(neutral_move)
+        except RequestError:
+            (board.board, board.previous_boards, board.is_red_move, board.move_type,
+             self.winner) = before
+            raise
+
+    def end_turn(self) -> None:
+        """End the turn of the player to move, who has played their L move and may have played
+        their neutral move, and end the game if the other player has no L move."""
+        self.board.is_red_move = not self.board.is_red_move
+        self.board.move_type = 'red' if self.board.is_red_move else 'blue'
+        if self.board.get_valid_moves() == []:
+            self.winner = 'blue' if self.board.is_red_move else 'red'
+
+    def ai_to_move(self) -> bool:
+        """Return whether the game is waiting for the AI."""
+        return self.winner is None and self.board.is_red_move == (self.ai_colour == 'red')
+
+
+class GameServer:
+    """An asyncio server hosting L Games against the AI.
+
+    Instance Attributes:
+        - workers: the number of worker processes searching, or 0 to search on one thread
+        - depth: the default depth of the AI's searches
+        - time_limit: the default seconds the AI may search for a move
+        - max_depth: the greatest depth a client may ask for
+        - max_time_limit: the most seconds a client may ask the AI to search for a move
+        - sessions: the games being played, by id
+
+    Representation Invariants:
+        - self.workers >= 0
+        - 1 <= self.depth <= self.max_depth
+        - 0 <= self.time_limit <= self.max_time_limit
+    """
+    workers: int
+    depth: int
+    time_limit: float
+    max_depth: int
+    max_time_limit: float
+    sessions: dict[int, GameSession]
+
+    # Private Instance Attributes:
+    #  - _executor: the pool the searches run in
+    #  - _ids: the ids of the next sessions
+    #  - _started: the time.perf_counter() value when the server was made
+    #  - _counts: the number of requests, errors, sessions started and AI moves made
+    #  - _latency: the seconds taken to answer each of the latest move requests
+    #  - _search_time: the seconds spent in each of the latest searches, in the worker
+    #  - _caches: the latest cache statistics of each worker, by process id
+    _executor: Executor
+    _ids: itertools.count
+    _started: float
+    _counts: dict[str, int]
+    _latency: deque[float]
+    _search_time: deque[float]
+    _caches: dict[int, dict[str, Any]]
+
+    def __init__(self, workers: int = 0, depth: int = DEFAULT_DEPTH,
+                 time_limit: float = DEFAULT_TIME_LIMIT, table_size: int = 1 << 18,
+                 max_depth: int = MAX_DEPTH, max_time_limit: float = MAX_TIME_LIMIT) -> None:
+        """Initialize a server whose AI searches in workers processes (or on one thread, if
+        workers is 0), each with a transposition table of table_size entries.
+
+        Preconditions:
+            - workers >= 0
+            - 1 <= depth <= max_depth
+            - 0 <= time_limit <= max_time_limit
+            - table_size > 0
+        """
+        self.workers = workers
+        self.depth = depth
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.max_time_limit = max_time_limit
+        self.sessions = {}
+        if workers == 0:
+            self._executor = ThreadPoolExecutor(1, initializer=_init_worker,
+                                                initargs=(table_size,))
+        else:
+            self._executor = ProcessPoolExecutor(workers, initializer=_init_worker,
+                                                 initargs=(table_size,))
+        self._ids = itertools.count(1)
+        self._started = time.perf_counter()
+        self._counts = {'requests': 0, 'errors': 0, 'sessions': 0, 'ai_moves': 0}
+        self._latency = deque(maxlen=LATENCY_WINDOW)
+        self._search_time = deque(maxlen=LATENCY_WINDOW)
+        self._caches = {}
+
+    async def start(self, host: str = '127.0.0.1', port: int = DEFAULT_PORT,
+                    path: Optional[str] = None) -> asyncio.AbstractServer:
+        """Start serving on the Unix socket path, or on host and port if path is None, and
+        return the asyncio server."""
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle_connection, path)
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    def close(self) -> None:
+        """Stop the worker pool."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def handle_connection(self, reader: asyncio.StreamReader,
+                                writer: asyncio.StreamWriter) -> None:
+        """Answer the requests of one client until it disconnects, then end its games."""
+        own_sessions = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                reply = await self.handle_request(line, own_sessions)
+                writer.write(json.dumps(reply).encode() + b'\n')
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            # the client went away, or the server is shutting down
+            pass
+        finally:
+            for session_id in own_sessions:
+                self.sessions.pop(session_id, None)
+            writer.close()
+
+    async def handle_request(self, line: bytes, own_sessions: set[int]) -> dict[str, Any]:
+        """Return the reply to line, a request from the client owning the sessions own_sessions.
+
+        >>> server = GameServer()
+        >>> asyncio.run(server.handle_request(b'{"op": "resign"}', set()))
+        {'error': 'unknown op: resign'}
+        >>> asyncio.run(server.handle_request(b'{"op": "new", "time_limit": NaN}', set()))
+        {'error': 'depth must be at least 1 and time_limit at least 0'}
+        >>> reply = asyncio.run(server.handle_request(b'{"op": "new", "depth": 1e9}', set()))
+        >>> reply['depth'], reply['time_limit']
+        (20, 0.5)
+        >>> server.close()
+        """
+        self._counts['requests'] += 1
+        start = time.perf_counter()
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise RequestError('a request must be a JSON object')
+            op = request.get('op')
+            if op == 'new':
+                reply = await self._new_game(request, own_sessions)
+            elif op == 'move':
+                reply = await self._move(request, own_sessions)
+                self._latency.append(time.perf_counter() - start)
+            elif op == 'end':
+                session_id = request.get('session')
+                if session_id not in own_sessions:
+                    raise RequestError(f'no game with session {session_id}')
+                own_sessions.remove(session_id)
+                del self.sessions[session_id]
+                reply = {'session': session_id, 'ended': True}
+            elif op == 'stats':
+                reply = self.metrics()
+            else:
+                raise RequestError(f'unknown op: {op}')
+        except (RequestError, TypeError, ValueError, OverflowError) as error:
+            self._counts['errors'] += 1
+            return {'error': str(error)}
+        return reply
+
+    def metrics(self) -> dict[str, Any]:
+        """Return the server's throughput and latency so far.
+
+        The latencies are percentiles of the time to answer each of the latest LATENCY_WINDOW
+        move requests, and of the time each of the latest searches took in its worker; the
+        difference is the time spent waiting for a free worker.
+
+        >>> server = GameServer()
+        >>> server.metrics()['requests'], server.metrics()['move_latency']
+        (0, {})
+        >>> server.close()
+        """
+        uptime = time.perf_counter() - self._started
+        return {**self._counts,
+                'uptime': uptime,
+                'open_sessions': len(self.sessions),
+                'ai_moves_per_second': self._counts['ai_moves'] / uptime,
+                'move_latency': _percentiles(self._latency),
+                'search_time': _percentiles(self._search_time),
+                'workers': dict(self._caches)}
+
+    async def _new_game(self, request: dict[str, Any], own_sessions: set[int]) -> dict[str, Any]:
+        """Start the game asked for by request and return the reply."""
+        ai_colour = request.get('ai', 'blue')
+        if ai_colour not in ('red', 'blue'):
+            raise RequestError(f"ai must be 'red' or 'blue', not {ai_colour}")
+        depth = float(request.get('depth', self.depth))
+        time_limit = float(request.get('time_limit', self.time_limit))
+        if not (math.isfinite(depth) and math.isfinite(time_limit)) or depth < 1 or time_limit < 0:
+            raise RequestError('depth must be at least 1 and time_limit at least 0')
+        # a client asking for more than the server allows gets the most it allows
+        depth = int(min(depth, self.max_depth))
+        time_limit = min(time_limit, self.max_time_limit)
+        session = GameSession(next(self._ids), ai_colour, depth, time_limit)
+        self.sessions[session.id] = session
+        own_sessions.add(session.id)
+        self._counts['sessions'] += 1
+        reply = {'session': session.id, 'depth': depth, 'time_limit': time_limit}
+        if session.ai_to_move():
+            reply.update(await self._ai_turn(session))
+        reply.update(board=session.board.board, winner=session.winner)
+        return reply
+
+    async def _move(self, request: dict[str, Any], own_sessions: set[int]) -> dict[str, Any]:
+        """Play the human's turn given in request and the AI's reply, and return the reply."""
+        session = self.sessions.get(request.get('session'))
+        if session is None or session.id not in own_sessions:
+            raise RequestError(f"no game with session {request.get('session')}")
+        if session.winner is not None:
+            raise RequestError(f'the game is over: {session.winner} has won')
+        if session.ai_to_move():
+            raise RequestError('it is not your turn')
+        session.play_turn(request.get('l_move'), request.get('neutral_move'))
+        reply = {'session': session.id}
+        if session.ai_to_move():
+            reply.update(await self._ai_turn(session))
+        reply.update(board=session.board.board, winner=session.winner)
+        return reply
+
+    async def _ai_turn(self, session: GameSession) -> dict[str, Any]:
+        """Play the AI's L move and neutral move in session, and return them with the depth and
+        positions searched."""
+        reply = {'searched_depth': [], 'nodes': 0}
+        for move_name in ('ai_l_move', 'ai_neutral_move'):
+            job = (session.board.board, session.board.previous_boards.copy(),
+                   session.board.is_red_move, session.board.move_type, session.depth,
+                   session.time_limit)
+            result = await asyncio.get_running_loop().run_in_executor(self._executor,
+                                                                      _choose_move, job)
+            move, searched_depth, nodes, search_time, worker, caches = result
+            self._counts['ai_moves'] += 1
+            self._search_time.append(search_time)
+            self._caches[worker] = caches
+            reply[move_name] = move
+            reply['searched_depth'].append(searched_depth)
+            reply['nodes'] += nodes
+            session.play(move)
+        return reply
+
+
+def _percentiles(values: deque[float]) -> dict[str, float]:
+    """Return the median, 95th percentile and greatest of values, in milliseconds, or {} if
+    there are none.
+
+    >>> _percentiles(deque([i / 1000 for i in range(1, 101)]))
+    {'p50': 51.0, 'p95': 96.0, 'max': 100.0}
+    """
+    if not values:
+        return {}
+    ordered = sorted(values)
+    n = len(ordered)
+    return {'p50': ordered[n // 2] * 1000, 'p95': ordered[min(n - 1, n * 95 // 100)] * 1000,
+            'max': ordered[-1] * 1000}
+
+
+# The player whose engine chooses every move this worker is asked for
+_worker_player = None
+
+
+def _init_worker(table_size: int) -> None:
+    """Make the player whose search and caches this worker uses for every game, with the moves
+    it does not have cached read from the shared move table."""
+    global _worker_player
+    share_moves()
+    _worker_player = AlphaBetaPlayer(1, False, table_size, symmetric=True)
+
+
+def _choose_move(job: tuple[list, PositionHistory, bool, str, int, float]) -> tuple:
+    """Return the move chosen for the game state in job, (board, previous boards, is_red_move,
+    move_type, depth, time_limit), along with the depth and positions searched, the seconds taken,
+    this worker's process id and its cache statistics."""
+    board, previous_boards, is_red_move, move_type, depth, time_limit = job
+    start = time.perf_counter()
+    player = _worker_player
+    player.depth, player.time_limit = depth, time_limit
+    move = player.make_move(Board(board, previous_boards, is_red_move, move_type))
+    caches = {'move_cache': MOVE_CACHE.stats(), 'table': player.engine.table.stats(),
+              'total_nodes': player.engine.total_nodes}
+    return (move, player.searched_depth, player.engine.nodes, time.perf_counter() - start,
+            os.getpid(), caches)
+
+
+async def serve(server: GameServer, host: str, port: int, path: Optional[str],
+                metrics_interval: Optional[float]) -> None:
+    """Run server until it is interrupted, printing its metrics every metrics_interval seconds
+    if that is given."""
+    listener = await server.start(host, port, path)
+    print(f'Serving L Games on {path if path is not None else f"{host}:{port}"}')
+    try:
+        async with listener:
+            if metrics_interval is None:
+                await listener.serve_forever()
+            else:
+                asyncio.create_task(listener.serve_forever())
+                while True:
+                    await asyncio.sleep(metrics_interval)
+                    print(json.dumps(server.metrics()))
+    finally:
+        server.close()
+
+
+def main(argv: list[str]) -> None:
+    """Run the server as the command line arguments argv ask."""
+    parser = argparse.ArgumentParser(description='Host L Games against the AI.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', metavar='PATH', help='serve on this Unix socket instead')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='the number of search processes, or 0 to search on one thread')
+    parser.add_argument('--depth', type=int, default=DEFAULT_DEPTH)
+    parser.add_argument('--time-limit', type=float, default=DEFAULT_TIME_LIMIT)
+    parser.add_argument('--max-depth', type=int, default=MAX_DEPTH,
+                        help='the greatest depth a client may ask for')
+    parser.add_argument('--max-time-limit', type=float, default=MAX_TIME_LIMIT,
+                        help='the most seconds a move a client may ask for')
+    parser.add_argument('--metrics-interval', type=float,
+                        help='print the metrics every this many seconds')
+    args = parser.parse_args(argv)
+
+    server = GameServer(args.workers, args.depth, args.time_limit,
+                        max_depth=args.max_depth, max_time_limit=args.max_time_limit)
+    try:
+        asyncio.run(serve(server, args.host, args.port, args.unix, args.metrics_interval))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
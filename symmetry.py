@@ -0,0 +1,256 @@
+"""
+CSC111 2021 Final Project - The L Game
+
+This file stores the symmetry functions for L Game positions. The 4x4 board has 8 dihedral
+symmetries (4 rotations, each with or without a mirror), and swapping the red and blue pieces
+along with the player to move gives another 8. Positions related by any of these 16 transforms
+play out identically, so searches, caches and tables can store one canonical key for all of them.
+
+A transform is an int from 0 to 15. Bits 0-2 pick the dihedral symmetry and bit 3 is the colour
+swap.
+
+Finding the canonical key of a state tries all 16 transforms, which takes longer than searching
+the state. The SymmetryTable holds the canonical state and transform of every game state, so a
+search can look them up instead. Given one, AlphaBetaSearch (symmetric=True) and gen_gametree and
+GameTree.search (symmetry=...) key their transposition tables by canonical state, as do
+AlphaBetaPlayer and MiniMaxPlayer with symmetric=True.
+
+This file is Copyright (c) 2021 Siddarth Dagar, Daniel Zhu, and Bradley Mathi.
+"""
+from __future__ import annotations
+import os
+import sys
+from array import array
+from constants import ROWS, COLS
+from bitboard import Position
+from ranking import STATES, state_rank, unrank_state
+from tables import cast_table, map_table, write_table
+
+COLOUR_SWAP = 8
+TRANSFORMS = tuple(range(16))
+
+SYMMETRY_TABLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'symmetry.bin')
+_SYMMETRY_HEADER = b'LGSY' + bytes([1])
+
+# Where each dihedral symmetry sends the square (row, col) of the 4x4 board
+_DIHEDRAL = (lambda row, col: (row, col),
+             lambda row, col: (col, COLS - 1 - row),
+             lambda row, col: (ROWS - 1 - row, COLS - 1 - col),
+             lambda row, col: (COLS - 1 - col, row),
+             lambda row, col: (row, COLS - 1 - col),
+             lambda row, col: (col, row),
+             lambda row, col: (ROWS - 1 - row, col),
+             lambda row, col: (COLS - 1 - col, ROWS - 1 - row))
+# Only the quarter turns are not their own inverse
+_DIHEDRAL_INVERSE = (0, 3, 2, 1, 4, 5, 6, 7)
+
+
+def _square_tables(symmetry: int) -> tuple[tuple[int, ...], tuple[int, ...]]:
+    """Return lookup tables giving the image under symmetry of every low byte and every high
+    byte of a 16-bit square mask."""
+    image = []
+    for index in range(ROWS * COLS):
+        row, col = _DIHEDRAL[symmetry](index // COLS, index % COLS)
+        image.append(row * COLS + col)
+    tables = []
+    for shift in (0, 8):
+        table = []
+        for byte in range(256):
+            mask = 0
+            for bit in range(8):
+                if byte >> bit & 1:
+                    mask |= 1 << image[bit + shift]
+            table.append(mask)
+        tables.append(tuple(table))
+    return tables[0], tables[1]
+
+
+_MASK_TABLES = tuple(_square_tables(symmetry) for symmetry in range(len(_DIHEDRAL)))
+
+
+def transform_mask(mask: int, transform: int) -> int:
+    """Return the image of the square mask under the dihedral part of transform.
+
+    >>> transform_mask(0b1, 1)  # a quarter turn sends the top left corner to the top right
+    8
+    """
+    low, high = _MASK_TABLES[transform & 7]
+    return low[mask & 0xFF] | high[mask >> 8]
+
+
+def transform_position(position: Position, transform: int) -> Position:
+    """Return the image of position under transform.
+
+    >>> p = Position(0b0000000100010011, 0b1100100010000000, 0b0000000000100100)
+    >>> all(transform_position(transform_position(p, t), inverse(t)) == p for t in TRANSFORMS)
+    True
+    """
+    low, high = _MASK_TABLES[transform & 7]
+    red = low[position.red & 0xFF] | high[position.red >> 8]
+    blue = low[position.blue & 0xFF] | high[position.blue >> 8]
+    neutral = low[position.neutral & 0xFF] | high[position.neutral >> 8]
+    if transform & COLOUR_SWAP:
+        return Position(blue, red, neutral)
+    return Position(red, blue, neutral)
+
+
+def transform_state(position: Position, is_red_move: bool, move_type: str,
+                    transform: int) -> tuple[Position, bool, str]:
+    """Return the image of the state (position, is_red_move, move_type) under transform.
+
+    Preconditions:
+        - move_type in {'red', 'blue', 'black'}
+    """
+    position = transform_position(position, transform)
+    if transform & COLOUR_SWAP:
+        is_red_move = not is_red_move
+        move_type = {'red': 'blue', 'blue': 'red'}.get(move_type, move_type)
+    return position, is_red_move, move_type
+
+
+def inverse(transform: int) -> int:
+    """Return the transform that undoes transform.
+
+    >>> inverse(1), inverse(1 | COLOUR_SWAP), inverse(5)
+    (3, 11, 5)
+    """
+    return _DIHEDRAL_INVERSE[transform & 7] | transform & COLOUR_SWAP
+
+
+def state_key(position: Position, is_red_move: bool, move_type: str) -> int:
+    """Return a single int identifying the state (position, is_red_move, move_type)."""
+    return position.pack() << 2 | is_red_move << 1 | (move_type == 'black')
+
+
+def canonical(position: Position, is_red_move: bool = True,
+              move_type: str = 'red') -> tuple[int, int]:
+    """Return (key, transform) where key is the canonical key shared by every state symmetric to
+    (position, is_red_move, move_type), and transform maps that state onto the canonical one.
+
+    Preconditions:
+        - move_type in {'red', 'blue', 'black'}
+
+    >>> from constants import STARTING_BOARD
+    >>> start = Position.from_board(STARTING_BOARD)
+    >>> key, transform = canonical(start)
+    >>> canonical(transform_position(start, 5 | COLOUR_SWAP), False, 'blue')[0] == key
+    True
+    >>> state_key(*transform_state(start, True, 'red', transform)) == key
+    True
+    """
+    best_key = best_transform = None
+    for transform in TRANSFORMS:
+        key = state_key(*transform_state(position, is_red_move, move_type, transform))
+        if best_key is None or key < best_key:
+            best_key, best_transform = key, transform
+    return best_key, best_transform
+
+
+def canonical_state(key: int) -> tuple[Position, bool, str]:
+    """Return the canonical state (position, is_red_move, move_type) that key identifies.
+
+    Preconditions:
+        - key was returned by state_key or canonical
+    """
+    is_red_move = bool(key >> 1 & 1)
+    if key & 1:
+        move_type = 'black'
+    else:
+        move_type = 'red' if is_red_move else 'blue'
+    return Position.unpack(key >> 2), is_red_move, move_type
+
+
+def untransform_move(move: Position, transform: int) -> Position:
+    """Return the move in the original orientation, given move chosen in the canonical orientation
+    reached by transform.
+
+    >>> from constants import STARTING_BOARD
+    >>> from bitboard import valid_moves
+    >>> start = Position.from_board(STARTING_BOARD)
+    >>> _, transform = canonical(start)
+    >>> canonical_start, _, canonical_type = transform_state(start, True, 'red', transform)
+    >>> moves = [untransform_move(move, transform)
+    ...          for move in valid_moves(canonical_start, canonical_type)]
+    >>> sorted(moves) == sorted(valid_moves(start, 'red'))
+    True
+    """
+    return transform_position(move, inverse(transform))
+
+
+def transform_board(board: list, transform: int) -> list:
+    """Return the image of the nested list board under transform."""
+    return transform_position(Position.from_board(board), transform).to_board()
+
+
+class SymmetryTable:
+    """The canonical state of every game state, read from a file mapped into memory (see
+    tables.py).
+
+    The file holds the header, then for every state, in the order of state rank (see
+    ranking.state_rank), the 4 byte rank of its canonical state, then for every state the 1 byte
+    transform that maps it onto its canonical state. Every integer is little-endian.
+
+    Instance Attributes:
+        - path: the file the table is mapped from
+
+    >>> from constants import STARTING_BOARD
+    >>> table = SymmetryTable()
+    >>> start = Position.from_board(STARTING_BOARD)
+    >>> key, transform = table.canonical(start, True, 'red')
+    >>> unrank_state(key) == canonical_state(canonical(start)[0])
+    True
+    >>> table.canonical(transform_position(start, 6 | COLOUR_SWAP), False, 'blue')[0] == key
+    True
+    """
+    path: str
+
+    # Private Instance Attributes:
+    #  - _keys: the rank of the canonical state of each state, by state rank
+    #  - _transforms: the transform onto the canonical state of each state, by state rank
+    _keys: memoryview
+    _transforms: memoryview
+
+    def __init__(self, path: str = SYMMETRY_TABLE_FILE) -> None:
+        """Map the symmetry table at path, building it and saving it there first if needed."""
+        self.path = path
+        data = map_table(path, _SYMMETRY_HEADER)
+        if data is None or len(data) != STATES * 5:
+            write_table(path, _SYMMETRY_HEADER, build_symmetry_table())
+            data = map_table(path, _SYMMETRY_HEADER)
+        self._keys = cast_table(data[:STATES * 4], 'I')
+        self._transforms = data[STATES * 4:]
+
+    def __deepcopy__(self, memo: dict) -> SymmetryTable:
+        """Return this table, which is read-only, so a copy of a search shares its mapping."""
+        return self
+
+    def __reduce__(self) -> tuple:
+        """Pickle this table as its path, so another process maps the same file."""
+        return SymmetryTable, (self.path,)
+
+    def canonical(self, position: Position, is_red_move: bool,
+                  move_type: str) -> tuple[int, int]:
+        """Return (key, transform) where key is the rank of the canonical state of (position,
+        is_red_move, move_type), shared by every state symmetric to it, and transform maps the
+        state onto the canonical one.
+
+        Preconditions:
+            - move_type in {'red', 'blue', 'black'}
+            - move_type == 'black' or is_red_move == (move_type == 'red')
+            - position is a legal position
+        """
+        index = state_rank(position, is_red_move, move_type)
+        return self._keys[index], self._transforms[index]
+
+
+def build_symmetry_table() -> list[bytes]:
+    """Return the two parts of a symmetry table file after its header, found by canonical."""
+    keys = array('I')
+    transforms = bytearray()
+    for index in range(STATES):
+        key, transform = canonical(*unrank_state(index))
+        keys.append(state_rank(*canonical_state(key)))
+        transforms.append(transform)
+    if sys.byteorder == 'big':
+        keys.byteswap()
+    return [keys.tobytes(), bytes(transforms)]
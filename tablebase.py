@@ -0,0 +1,185 @@
+"""
+CSC111 2021 Final Project - The L Game
+
+This file stores the retrograde-analysis solver for the L Game and the Tablebase class that reads
+its results. Every position reachable from STARTING_BOARD is solved into a win, loss or draw for
+the player to move, together with the number of moves (L and neutral moves each count as one) to
+the end of the game under perfect play.
+
+The solved table is saved to a small binary file the first time it is built, so later loads only
+map the file into memory read-only (see tables.py), which every process using it shares.
+Positions are solved without the rule that an L may not return to an earlier board, since that
+depends on the history of the game rather than the position.
+
+This file is Copyright (c) 2021 Siddarth Dagar, Daniel Zhu, and Bradley Mathi.
+"""
+from __future__ import annotations
+import os
+from array import array
+from collections import deque
+from typing import Optional
+from constants import STARTING_BOARD
+from bitboard import Position, next_turn, valid_moves
+from ranking import STATES, state_rank
+from tables import map_table, write_table
+
+TABLEBASE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tablebase.bin')
+
+# Results, from the point of view of the player to move
+UNKNOWN, DRAW, WIN, LOSS = 0, 1, 2, 3
+
+_MAGIC = b'LGTB'
+_VERSION = 2
+_HEADER = _MAGIC + bytes([_VERSION])
+_TABLE_SIZE = STATES
+# each entry is one byte: the result in the top 2 bits and the distance to mate in the bottom 6
+_DTM_BITS = 6
+_DTM_MASK = (1 << _DTM_BITS) - 1
+
+
+def state_index(position: Position, is_red_move: bool, move_type: str) -> int:
+    """Return the table index of position with the given player and piece to move, which is its
+    rank among all game states (see ranking.state_rank).
+
+    Preconditions:
+        - move_type in {'red', 'blue', 'black'}
+    """
+    return state_rank(position, is_red_move, move_type)
+
+
+def solve() -> array:
+    """Solve every position reachable from STARTING_BOARD by retrograde analysis.
+
+    Return the packed table described in _DTM_BITS, indexed by state_index.
+    """
+    start = (Position.from_board(STARTING_BOARD), True, 'red')
+    # the number in states of each state found so far, by state_index, or -1
+    index_of = array('l', [-1]) * _TABLE_SIZE
+    index_of[state_index(*start)] = 0
+    states = [start]
+    successors = []
+    # breadth first search for every reachable state and its successors
+    i = 0
+    while i < len(states):
+        position, is_red_move, move_type = states[i]
+        children = []
+        for move in valid_moves(position, move_type):
+            child = (move, *next_turn(is_red_move, move_type))
+            key = state_index(*child)
+            if index_of[key] < 0:
+                index_of[key] = len(states)
+                states.append(child)
+            children.append(index_of[key])
+        successors.append(children)
+        i += 1
+
+    predecessors = [[] for _ in states]
+    for parent, children in enumerate(successors):
+        for child in children:
+            predecessors[child].append(parent)
+
+    results = [UNKNOWN] * len(states)
+    dtm = [0] * len(states)
+    remaining = [len(children) for children in successors]
+    queue = deque()
+    for s, (_, _, move_type) in enumerate(states):
+        if move_type != 'black' and remaining[s] == 0:
+            results[s] = LOSS
+            queue.append(s)
+
+    while queue:
+        s = queue.popleft()
+        for p in predecessors[s]:
+            if results[p] != UNKNOWN:
+                continue
+            # the player to move only changes after a neutral move
+            if states[p][2] == 'black':
+                good_for_parent = results[s] == LOSS
+            else:
+                good_for_parent = results[s] == WIN
+            if good_for_parent:
+                results[p] = WIN
+                dtm[p] = dtm[s] + 1
+                queue.append(p)
+            else:
+                remaining[p] -= 1
+                if remaining[p] == 0:
+                    results[p] = LOSS
+                    dtm[p] = dtm[s] + 1
+                    queue.append(p)
+
+    table = array('B', bytes(_TABLE_SIZE))
+    for s, state in enumerate(states):
+        result = results[s] if results[s] != UNKNOWN else DRAW
+        table[state_index(*state)] = result << _DTM_BITS | dtm[s]
+    return table
+
+
+class Tablebase:
+    """The solved L Game, mapped from (or built into) a tablebase file.
+
+    Instance Attributes:
+        - path: the file this tablebase was mapped from or saved to
+    """
+    path: str
+
+    # Private Instance Attributes:
+    #  - _table: one packed result byte per state, indexed by state_index, shared with every
+    #    process that maps the same file
+    _table: memoryview
+
+    def __init__(self, path: str = TABLEBASE_FILE) -> None:
+        """Map the tablebase at path, solving the game and saving it there first if needed."""
+        self.path = path
+        table = _read_table(path)
+        if table is None:
+            _write_table(path, solve())
+            table = _read_table(path)
+        self._table = table
+
+    def __deepcopy__(self, memo: dict) -> Tablebase:
+        """Return this tablebase, which is read-only, so a copy of a player shares its mapping."""
+        return self
+
+    def __reduce__(self) -> tuple:
+        """Pickle this tablebase as its path, so another process maps the same file."""
+        return Tablebase, (self.path,)
+
+    def lookup(self, position: Position, is_red_move: bool, move_type: str) -> tuple[int, int]:
+        """Return (result, moves to mate) for the player to move in the given state.
+
+        result is one of WIN, LOSS or DRAW (or UNKNOWN for a position that cannot be reached from
+        the starting board). The moves to mate of a draw are 0.
+
+        >>> tb = Tablebase()
+        >>> tb.lookup(Position.from_board(STARTING_BOARD), True, 'red')[0] == DRAW
+        True
+        """
+        entry = self._table[state_index(position, is_red_move, move_type)]
+        return entry >> _DTM_BITS, entry & _DTM_MASK
+
+
+def _read_table(path: str) -> Optional[memoryview]:
+    """Return the table stored at path, mapped read-only, or None if there is no usable
+    tablebase file there."""
+    table = map_table(path, _HEADER)
+    if table is None or len(table) != _TABLE_SIZE:
+        return None
+    return table
+
+
+def _write_table(path: str, table: array) -> None:
+    """Save table to path in the tablebase file format."""
+    write_table(path, _HEADER, [table.tobytes()])
+
+
+if __name__ == '__main__':
+    import time
+
+    begin = time.perf_counter()
+    solved = solve()
+    print(f'Solved in {time.perf_counter() - begin:.2f}s')
+    _write_table(TABLEBASE_FILE, solved)
+    begin = time.perf_counter()
+    Tablebase()
+    print(f'Mapped in {(time.perf_counter() - begin) * 1000:.1f}ms')
@@ -0,0 +1,160 @@
+"""
+CSC111 2021 Final Project - The L Game
+
+This file stores the shared position tables: tables precomputed for every legal position, saved in
+files of a fixed layout that each process maps into memory read-only with mmap instead of reading.
+
+A mapped table is not copied into the process. Every process that maps the same file shares the
+one copy the operating system keeps of it, and opening a table only maps it, so it is ready as soon
+as it is opened; only the first process to need a table that has no file yet builds and saves it.
+
+The tables are the tablebase (see tablebase.py), the SymmetryTable (see symmetry.py) and the
+MoveTable below, which holds the valid moves of every position. share_moves makes MOVE_CACHE
+generate the moves it does not have from the MoveTable, which is how the worker processes of the
+server and of play_games share one set of moves.
+
+This file is Copyright (c) 2021 Siddarth Dagar, Daniel Zhu, and Bradley Mathi.
+"""
+from __future__ import annotations
+import mmap
+import os
+import sys
+from array import array
+from typing import Iterable, Optional
+from bitboard import Position, MOVE_CACHE, valid_moves
+from ranking import POSITIONS, rank, unrank
+
+MOVE_TABLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'movetable.bin')
+
+_MOVE_MAGIC = b'LGMT'
+_MOVE_VERSION = 1
+_MOVE_TYPES = ('red', 'blue', 'black')
+_MOVE_TYPE_INDEX = {move_type: i for i, move_type in enumerate(_MOVE_TYPES)}
+# The number of lists of moves in a MoveTable, one per position and move type
+_MOVE_LISTS = POSITIONS * len(_MOVE_TYPES)
+
+
+def map_table(path: str, header: bytes) -> Optional[memoryview]:
+    """Map the file at path into memory read-only, and return the bytes after its header.
+
+    Return None if there is no such file or it does not start with header.
+    """
+    try:
+        with open(path, 'rb') as file:
+            mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # ValueError is raised for an empty file, which cannot be mapped
+        return None
+    if mapping[:len(header)] != header:
+        mapping.close()
+        return None
+    # the memoryview keeps the mapping open for as long as it is used
+    return memoryview(mapping)[len(header):]
+
+
+def write_table(path: str, header: bytes, parts: Iterable[bytes]) -> None:
+    """Save header followed by parts to the file at path.
+
+    The file is written under another name and then renamed, so another process opening path
+    at the same time sees either the whole file or none of it.
+    """
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(header)
+        for part in parts:
+            file.write(part)
+    os.replace(temporary, path)
+
+
+def cast_table(data: memoryview, typecode: str) -> memoryview:
+    """Return data, a part of a table file, as a sequence of the little-endian ints of typecode.
+
+    The cast shares data's memory, except on a big-endian machine, where the ints are copied.
+    """
+    if sys.byteorder == 'little':
+        return data.cast(typecode)
+    ints = array(typecode, data)
+    ints.byteswap()
+    return memoryview(ints)
+
+
+class MoveTable:
+    """The valid moves of every legal position, read from a file mapped into memory.
+
+    The moves of each position and move type are stored as the ranks (see ranking.rank) of the
+    positions they lead to, in the order of valid_moves. The file holds the header, then for
+    every list of moves, in the order of position rank and then 'red', 'blue', 'black', the 4 byte
+    offset of its first move, then one more offset for the end of the last list, then every move
+    as a 2 byte rank. Every integer is little-endian.
+
+    Instance Attributes:
+        - path: the file the table is mapped from
+
+    >>> from constants import STARTING_BOARD
+    >>> table = MoveTable()
+    >>> start = Position.from_board(STARTING_BOARD)
+    >>> table.moves(start, 'black') == tuple(valid_moves(start, 'black'))
+    True
+    """
+    path: str
+
+    # Private Instance Attributes:
+    #  - _offsets: where each list of moves starts in _moves, followed by the length of _moves
+    #  - _moves: the ranks of the moves of every list, one list after the other
+    _offsets: memoryview
+    _moves: memoryview
+
+    def __init__(self, path: str = MOVE_TABLE_FILE) -> None:
+        """Map the move table at path, building it and saving it there first if needed."""
+        self.path = path
+        header = _MOVE_MAGIC + bytes([_MOVE_VERSION])
+        data = map_table(path, header)
+        if data is None or not _valid_move_table(data):
+            offsets, moves = build_move_table()
+            write_table(path, header, [offsets.tobytes(), moves.tobytes()])
+            data = map_table(path, header)
+        split = (_MOVE_LISTS + 1) * 4
+        self._offsets = cast_table(data[:split], 'I')
+        self._moves = cast_table(data[split:], 'H')
+
+    def moves(self, position: Position, move_type: str) -> tuple[Position, ...]:
+        """Return valid_moves(position, move_type) as a tuple.
+
+        Preconditions:
+            - move_type in {'red', 'blue', 'black'}
+            - position is a legal position
+        """
+        i = rank(position) * 3 + _MOVE_TYPE_INDEX[move_type]
+        return tuple([unrank(move) for move in self._moves[self._offsets[i]:self._offsets[i + 1]]])
+
+
+def _valid_move_table(data: memoryview) -> bool:
+    """Return whether data, the part of a move table file after its header, is the right size."""
+    split = (_MOVE_LISTS + 1) * 4
+    if len(data) < split:
+        return False
+    end = int.from_bytes(data[split - 4:split], 'little')
+    return len(data) == split + end * 2
+
+
+def build_move_table() -> tuple[array, array]:
+    """Return the offsets and moves of a MoveTable, generated by valid_moves."""
+    offsets = array('I', [0])
+    moves = array('H')
+    for position_rank in range(POSITIONS):
+        position = unrank(position_rank)
+        for move_type in _MOVE_TYPES:
+            moves.extend(rank(move) for move in valid_moves(position, move_type))
+            offsets.append(len(moves))
+    if sys.byteorder == 'big':
+        offsets.byteswap()
+        moves.byteswap()
+    return offsets, moves
+
+
+def share_moves(path: str = MOVE_TABLE_FILE) -> MoveTable:
+    """Make MOVE_CACHE look up the moves it does not have in the move table at path, instead of
+    generating them, and return the table."""
+    table = MoveTable(path)
+    MOVE_CACHE.table = table
+    return table
@@ -0,0 +1,179 @@
+"""
+CSC111 2021 Final Project - The L Game
+
+This file stores the Zobrist hashing functions and the TranspositionTable class used by the game
+tree searches. A transposition table remembers the score of every position a search has already
+expanded, so the same position reached by a different order of moves is not searched again.
+
+This file is Copyright (c) 2021 Siddarth Dagar, Daniel Zhu, and Bradley Mathi.
+"""
+from __future__ import annotations
+import random
+from typing import NamedTuple, Optional
+from constants import ROWS, COLS
+from bitboard import Position, squares
+
+# The random keys are seeded so that hashes are the same every time the game is run
+_rng = random.Random(111)
+_PIECE_KEYS = tuple(tuple(_rng.getrandbits(64) for _ in range(ROWS * COLS)) for _ in range(3))
+_RED_TO_MOVE_KEY = _rng.getrandbits(64)
+_NEUTRAL_TO_MOVE_KEY = _rng.getrandbits(64)
+
+# What a stored score says about the true score of the position
+EXACT, LOWER, UPPER = 'exact', 'lower', 'upper'
+
+
+def zobrist_hash(position: Position, is_red_move: bool, move_type: str) -> int:
+    """Return the Zobrist hash of the state (position, is_red_move, move_type).
+
+    >>> from constants import STARTING_BOARD
+    >>> start = Position.from_board(STARTING_BOARD)
+    >>> zobrist_hash(start, True, 'red') == zobrist_hash(start, False, 'blue')
+    False
+    """
+    key = 0
+    for piece_keys, mask in zip(_PIECE_KEYS, position):
+        for square in squares(mask):
+            key ^= piece_keys[square]
+    if is_red_move:
+        key ^= _RED_TO_MOVE_KEY
+    if move_type == 'black':
+        key ^= _NEUTRAL_TO_MOVE_KEY
+    return key
+
+
+def zobrist_update(key: int, old: Position, new: Position, move_type: str) -> int:
+    """Return the hash after the player to move plays the move_type piece(s) from old to new,
+    given the hash key of the state before the move.
+
+    The turn order follows gen_gametree: an L move is followed by the same player's neutral
+    move, and a neutral move by the other player's L move.
+
+    >>> from constants import STARTING_BOARD
+    >>> from bitboard import valid_moves
+    >>> start = Position.from_board(STARTING_BOARD)
+    >>> move = valid_moves(start, 'red')[0]
+    >>> zobrist_update(zobrist_hash(start, True, 'red'), start, move, 'red') == \\
+    ...     zobrist_hash(move, True, 'black')
+    True
+    """
+    for piece_keys, old_mask, new_mask in zip(_PIECE_KEYS, old, new):
+        for square in squares(old_mask ^ new_mask):
+            key ^= piece_keys[square]
+    key ^= _NEUTRAL_TO_MOVE_KEY
+    if move_type == 'black':
+        key ^= _RED_TO_MOVE_KEY
+    return key
+
+
+class TableEntry(NamedTuple):
+    """One stored search result.
+
+    Instance Attributes:
+        - key: the full Zobrist hash of the position, to tell apart positions sharing a slot
+        - depth: the depth the position was searched to
+        - score: the score of the position, on the scale of the search that stored it
+        - best_move: the best move found from the position, or None if it has no moves
+        - generation: the search that stored this entry
+        - bound: EXACT if score is the true score, or LOWER or UPPER if the search was cut off
+          and score is only a bound on it
+    """
+    key: int
+    depth: int
+    score: float
+    best_move: Optional[Position]
+    generation: int
+    bound: str = EXACT
+
+
+class TranspositionTable:
+    """A fixed size table of search results, keyed by Zobrist hash.
+
+    Each hash maps to a single slot. When two positions want the same slot, the new entry replaces
+    the old one if the old one was stored by an earlier search or was searched no deeper.
+
+    Instance Attributes:
+        - size: the maximum number of entries stored
+        - hits: the number of probes that found a usable entry
+        - misses: the number of probes that did not
+        - stores: the number of entries written
+        - rejected: the number of entries not written because a deeper entry held their slot
+
+    Representation Invariants:
+        - self.size > 0
+    """
+    size: int
+    hits: int
+    misses: int
+    stores: int
+    rejected: int
+
+    # Private Instance Attributes:
+    #  - _slots: the stored entries, with None for an empty slot
+    #  - _generation: the number of the current search
+    _slots: list[Optional[TableEntry]]
+    _generation: int
+
+    def __init__(self, size: int = 1 << 16) -> None:
+        """Initialize an empty transposition table holding at most size entries.
+
+        Preconditions:
+            - size > 0
+        """
+        self.size = size
+        self._slots = [None] * size
+        self._generation = 0
+        self.hits = self.misses = self.stores = self.rejected = 0
+
+    def new_search(self) -> None:
+        """Start a new search, so that entries from earlier searches may be replaced first."""
+        self._generation += 1
+
+    def probe(self, key: int, depth: int) -> Optional[TableEntry]:
+        """Return the entry for key if it was searched to at least depth, and None otherwise.
+
+        Entries with a score of 1.0 or -1.0 are forced wins (or trivial bounds), so they are
+        returned at any depth.
+        """
+        entry = self._slots[key % self.size]
+        if entry is not None and entry.key == key and (entry.depth >= depth or entry.score != 0.0):
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def get(self, key: int) -> Optional[TableEntry]:
+        """Return the entry for key whatever depth it was searched to, or None if there is none.
+
+        Unlike probe, this is not counted as a hit or a miss. Searches use it to find the best
+        move of an earlier, shallower search to try first.
+        """
+        entry = self._slots[key % self.size]
+        if entry is not None and entry.key == key:
+            return entry
+        return None
+
+    def store(self, key: int, depth: int, score: float, best_move: Optional[Position],
+              bound: str = EXACT) -> None:
+        """Store the result of searching the position with hash key to the given depth."""
+        slot = key % self.size
+        entry = self._slots[slot]
+        if entry is None or entry.key == key or entry.generation < self._generation \
+                or depth >= entry.depth:
+            self._slots[slot] = TableEntry(key, depth, score, best_move, self._generation,
+                                            bound)
+            self.stores += 1
+        else:
+            self.rejected += 1
+
+    def __len__(self) -> int:
+        """Return the number of entries stored."""
+        return sum(entry is not None for entry in self._slots)
+
+    def stats(self) -> dict[str, float]:
+        """Return the table's counters, along with its hit rate and how full it is."""
+        probes = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'stores': self.stores,
+                'rejected': self.rejected,
+                'hit_rate': self.hits / probes if probes else 0.0,
+                'fill': len(self) / self.size}